@@ -1,17 +1,30 @@
+import hashlib
 import os
+import time
+from collections import Counter
+from functools import lru_cache
 
-from flask import Flask, render_template, redirect, flash, session, g
-import random
-from sqlalchemy.exc import IntegrityError, PendingRollbackError
+import click
+from flask import Flask, render_template, redirect, flash, session, g, jsonify, request
+from sqlalchemy.exc import IntegrityError
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from flask_debugtoolbar import DebugToolbarExtension
 
 from dotenv import load_dotenv
-from models import db, connect_db, User, Pokemon, Pet, Type, Berry, UserBerry
-from forms import UserAddForm, LoginForm, UserEditForm, PetForm, ReleasePet, ForageForm, DeleteUser
-from functions import create_pokemon_db, get_random_ids, create_type_db, create_berry_db, berries, types, roll_dice, forage, play_phrases
+from models import db, connect_db, User, Pokemon, Pet, UserBerry, Pokedex, LOADER_PROFILES
+from auth import CURR_USER_KEY, CURR_USERNAME_KEY, current_user
+from throttle import LoginThrottle
+import compression
+from compression import DEFAULT_MIN_SIZE, ENCODINGS
+from passwords import PasswordHasherBusy, DEFAULT_LOG_ROUNDS, DEFAULT_WORKERS, DEFAULT_MAX_PENDING
+from forms import UserAddForm, LoginForm, UserEditForm, PetForm, ReleasePet, DeleteUser, ExpeditionForm
+from catalog import get_catalog
+import assets
+from sprites import build_sprites, format_sprite_report, sprite_url, atlas_classes
+from ticks import apply_tick, format_tick_report, DEFAULT_CHUNK_SIZE
+from functions import seed_reference_data, format_seed_report, reference_data_ready, nickname_candidates, NICKNAME_SUGGESTIONS, POKEDEX_PAGE_SIZE, ADOPTION_OFFER_SIZE, forage_trip, FORAGE_CHANGES, feed_apple, feed_berry, play_with
 
-CURR_USER_KEY = "curr_user"
 
 app = Flask(__name__)
 load_dotenv()
@@ -26,9 +39,51 @@ app.config['SQLALCHEMY_DATABASE_URI'] = (
 
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "password")
+# Seconds a user's adoption offer stays the same across reloads.
+app.config['ADOPTION_OFFER_TTL'] = int(os.environ.get('ADOPTION_OFFER_TTL', 600))
+# Seconds past that an adoption form opened in time can still be submitted.
+app.config['ADOPTION_OFFER_GRACE'] = int(os.environ.get('ADOPTION_OFFER_GRACE', 300))
+
+# bcrypt cost factor; existing hashes are upgraded on their next login.
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS))
+# Password hashes run at once per process, and how many may queue behind them.
+app.config['BCRYPT_WORKERS'] = int(os.environ.get('BCRYPT_WORKERS', DEFAULT_WORKERS))
+app.config['BCRYPT_MAX_PENDING'] = int(os.environ.get('BCRYPT_MAX_PENDING', DEFAULT_MAX_PENDING))
+
+# Login attempts as (burst, per minute), per client IP and per username,
+# checked before the password is. A burst of 0 turns that limit off.
+# 'database' shares the buckets between processes; 'memory' keeps them per
+# process.
+app.config['LOGIN_USER_LIMIT'] = (int(os.environ.get('LOGIN_USER_BURST', 5)),
+                                  float(os.environ.get('LOGIN_USER_PER_MINUTE', 5)))
+app.config['LOGIN_IP_LIMIT'] = (int(os.environ.get('LOGIN_IP_BURST', 20)),
+                                float(os.environ.get('LOGIN_IP_PER_MINUTE', 30)))
+app.config['LOGIN_THROTTLE_BACKEND'] = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+# Reverse proxies in front of the app. Behind one, the connecting address is
+# the proxy's, so the client IP (for the login throttle's per-IP limit) is
+# taken from this many X-Forwarded-For entries. Leave at 0 when clients
+# connect directly, or they could pick their own IP.
+app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+# HTML responses of at least this many bytes are compressed as they're
+# sent, in the first of these encodings the client accepts. Set
+# COMPRESS_ENCODINGS to "" when a proxy in front already compresses.
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE))
+app.config['COMPRESS_ENCODINGS'] = tuple(
+    filter(None, os.environ.get('COMPRESS_ENCODINGS', ','.join(ENCODINGS)).split(',')))
+
+ADOPTION_OFFER_KEY = "adoption_offer"
 
 debug = DebugToolbarExtension(app)
 connect_db(app)
+assets.init_app(app)
+compression.init_app(app)
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                            x_proto=app.config['TRUSTED_PROXIES'])
+app.jinja_env.globals['sprite_url'] = sprite_url
+app.jinja_env.globals['atlas_classes'] = atlas_classes
+login_throttle = LoginThrottle.from_config(app.config, db)
 
 
 
@@ -39,34 +94,69 @@ BASE_URL = 'https://pokeapi.co/api/v2/pokemon/'
 @app.before_request
 def add_user_to_g():
     """IF we're logged in, add current user to Flask global."""
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
-
-    else:
-        g.user = None
+    g.user = current_user()
 
 def do_login(user):
     """Log in user."""
     session[CURR_USER_KEY] = user.id
+    session[CURR_USERNAME_KEY] = user.username
 
 def do_logout():
     """ Log out user."""
     if CURR_USER_KEY in session:
         del session[CURR_USER_KEY]
+    session.pop(CURR_USERNAME_KEY, None)
+    session.pop(ADOPTION_OFFER_KEY, None)
 
 @app.errorhandler(404)
 def not_found(e):
     return render_template("404.html")
 
-with app.app_context():
-    if len(Berry.query.all()) == 0:
-        create_berry_db(db, berries)
-
-    if len(Type.query.all()) == 0:
-        create_type_db(db, types)
+@app.errorhandler(PasswordHasherBusy)
+def hasher_busy(e):
+    """Too many logins or signups at once; ask the user to retry"""
+    flash("Lots of trainers are logging in right now, please try again in a moment.", "DANGER")
+    return redirect(request.path)
 
-    if len(Pokemon.query.all()) == 0:
-        create_pokemon_db(150, db)
+with app.app_context():
+    if reference_data_ready(db):
+        get_catalog()
+    else:
+        app.logger.warning("Reference data is missing. Run `flask --app app seed` to load it.")
+
+@app.cli.command('seed')
+@click.option('--max-pokemon', default=150, help="Highest pokemon id to load.")
+@click.option('--sprites/--no-sprites', default=True, help="Also fetch artwork and build thumbnails.")
+def seed_command(max_pokemon, sprites):
+    """Loads berries, types and pokemon into the database."""
+    click.echo(format_seed_report(seed_reference_data(db, max_pokemon)))
+    if sprites:
+        click.echo(format_sprite_report(build_sprites(get_catalog().pokemon.values())))
+
+@app.cli.command('assets')
+def assets_command():
+    """Fingerprints the checked-in static files."""
+    click.echo(f"assets: {assets.build_bundled()} bundled files fingerprinted")
+
+@app.cli.command('sprites')
+def sprites_command():
+    """Fetches missing pokemon artwork and builds the thumbnails."""
+    click.echo(format_sprite_report(build_sprites(get_catalog().pokemon.values())))
+
+@app.cli.command('tick')
+@click.option('--hunger', default=0, help="Change to every pet's hunger.")
+@click.option('--happiness', default=0, help="Change to every pet's happiness.")
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, help="Pets updated per transaction.")
+@click.option('--workers', default=1, help="Number of processes sharing the tick.")
+@click.option('--worker', default=0, help="This process's share, 0 to workers-1.")
+@click.option('--tick-id', help="Shared by every worker of a tick; rerun with it to resume. New if not given.")
+def tick_command(hunger, happiness, chunk_size, workers, worker, tick_id):
+    """Applies stat changes to every pet in set-based chunks."""
+    try:
+        report = apply_tick(db, hunger, happiness, chunk_size, workers, worker, tick_id)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(format_tick_report(report))
 
 
 ############# SETUP ROUTES, login/logout/signup ##########################
@@ -117,9 +207,15 @@ def login():
     form = LoginForm()
 
     if form.validate_on_submit():
+        if not login_throttle.allow(form.username.data, request.remote_addr):
+            flash("Too many login attempts, please wait a minute and try again.", "DANGER")
+            return render_template('users/login.html', form=form), 429
+
         user = User.authenticate(username=form.username.data, password=form.password.data)
 
         if user:
+            # Saves the password hash if authenticate upgraded it.
+            db.session.commit()
             do_login(user)
             flash(f"Welcome back {user.username}!", "SUCCESS")
             return redirect('/')
@@ -140,17 +236,17 @@ def logout():
 def show_user_profile(user_id):
     """Shows user's profile details"""
     
-    user = User.query.get_or_404(user_id)
+    user = User.query.options(*LOADER_PROFILES['user_profile']).filter_by(id=user_id).first_or_404()
 
     return render_template('users/profile.html', user=user)
 
 @app.route('/users/details')
 def show_user_details():
     """Shows a user's private details and allows for edit. Unavailable if not logged in user."""
-    user = User.query.get_or_404(g.user.id)
     if not g.user:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
+    user = g.user._get_current_object()
 
     return render_template('users/details.html', user=user)
 
@@ -165,8 +261,9 @@ def edit_user():
         g.user.username = form.username.data
         g.user.email = form.email.data
 
-        db.session.add(g.user)
+        db.session.add(g.user._get_current_object())
         db.session.commit()
+        session[CURR_USERNAME_KEY] = g.user.username
         flash("User successfully edited.", "SUCCESS")
         return redirect(f'/users/{g.user.id}')
     return render_template('users/edit.html', form=form)
@@ -181,8 +278,8 @@ def delete_user():
     form = DeleteUser()
     if form.validate_on_submit():
         do_logout()
-        flash(f"Account deleted.", "DANGER")
-        db.session.delete(g.user)
+        flash("Account deleted.", "DANGER")
+        db.session.delete(g.user._get_current_object())
         db.session.commit()
         return redirect('/signup')
 
@@ -192,14 +289,40 @@ def delete_user():
 
 ################### ADOPTION ROUTES ##################
 
+def adoption_offer(grace=0):
+    """Returns the ids of the pokemon on offer to g.user.
+
+    Offers are drawn from the catalog by rarity and kept in the session for
+    ADOPTION_OFFER_TTL seconds, so reloading the adoption center shows the
+    same pokemon without a query. grace keeps an offer good for that many
+    seconds more, so a form opened before it expired can still be
+    submitted. Once every pokemon on offer is adopted a new offer is
+    drawn."""
+    catalog = get_catalog()
+    now = int(time.time())
+    offer = session.get(ADOPTION_OFFER_KEY)
+    if (offer and offer['user_id'] == g.user.id
+            and offer['expires'] + grace > now
+            and offer['ids']
+            and all(id in catalog.pokemon for id in offer['ids'])):
+        return offer['ids']
+
+    ids = catalog.rarity.sample(ADOPTION_OFFER_SIZE)
+    session[ADOPTION_OFFER_KEY] = {
+        'user_id': g.user.id,
+        'ids': ids,
+        'expires': now + app.config['ADOPTION_OFFER_TTL']
+    }
+    return ids
+
 @app.route('/pets/adopt')
 def adoption_center():
     """Shows adoptable pets"""
     if not g.user:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
-    ids = get_random_ids(3)
-    pokemon = Pokemon.query.filter(Pokemon.id.in_(ids))
+    catalog = get_catalog()
+    pokemon = [catalog.pokemon[id] for id in adoption_offer()]
     return render_template('adoption.html', pokemon=pokemon)
 
 @app.route('/pets/adopt/<int:poke_id>', methods=['GET', 'POST'])
@@ -208,20 +331,18 @@ def adopt_pet(poke_id):
     if not g.user:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
+    if poke_id not in adoption_offer(grace=app.config['ADOPTION_OFFER_GRACE']):
+        flash("That pokemon isn't up for adoption right now.", "DANGER")
+        return redirect('/pets/adopt')
     poke = Pokemon.query.get_or_404(poke_id)
     form = PetForm()
-    pets = Pet.query.all()
-    nicknames = []
 
     if len(g.user.pets) == 12:
         flash("Max amount of pets reached. In order to adopt a new pet, you must release one of your old pets.", "DANGER")
         return redirect(f'/users/{g.user.id}')
 
-    for pet in pets:
-        nicknames.append(pet.nickname)
-
     if form.validate_on_submit():
-        if form.nickname.data in nicknames:
+        if Pet.nickname_taken(form.nickname.data):
             flash(f'Nickname "{form.nickname.data} already taken, please pick another!', "DANGER")
             return render_template('pets/adopt.html', pokemon=poke, form=form)
         else:
@@ -232,10 +353,18 @@ def adopt_pet(poke_id):
                 )
             if (poke not in g.user.pokedex):
                 g.user.pokedex.append(poke)
-                db.session.commit()
             db.session.add(pet)
-            db.session.commit()
-
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Someone took the nickname between the check and the insert.
+                db.session.rollback()
+                flash(f'Nickname "{form.nickname.data} already taken, please pick another!', "DANGER")
+                return render_template('pets/adopt.html', pokemon=poke, form=form)
+
+            # Each pokemon on offer can be adopted once.
+            offer = session[ADOPTION_OFFER_KEY]
+            session[ADOPTION_OFFER_KEY] = dict(offer, ids=[id for id in offer['ids'] if id != poke_id])
             flash(f"{pet.nickname} the {poke.name[0].upper()}{poke.name[1:]} has been adopted! Congrats!", "SUCCESS")
 
             return redirect(f'/users/{g.user.id}')
@@ -244,20 +373,47 @@ def adopt_pet(poke_id):
         return render_template('pets/adopt.html', pokemon=poke, form=form)
     
 
+@app.route('/pets/nicknames/suggest')
+def suggest_nicknames():
+    """Checks a nickname and suggests free alternatives as JSON"""
+    if not g.user:
+        return jsonify(error="Access unauthorized."), 401
+    nickname = request.args.get('nickname', '').strip()
+    if not nickname:
+        return jsonify(error="nickname is required"), 400
+
+    catalog = get_catalog()
+    poke = catalog.pokemon.get(request.args.get('poke_id', type=int))
+    candidates = nickname_candidates(nickname, poke.name if poke else None)
+    taken = Pet.taken_nicknames([nickname] + candidates)
+
+    return jsonify(
+        nickname=nickname,
+        available=nickname.lower() not in taken,
+        suggestions=[name for name in candidates if name.lower() not in taken][:NICKNAME_SUGGESTIONS]
+    )
+    
+
 ###### PET ROUTES ##########
 @app.route('/pets/<int:pet_id>')
 def show_pet(pet_id):
     """ Shows a pet's details"""
-    pet = Pet.query.get_or_404(pet_id)
-    type = Type.query.get_or_404(pet.pokemon.type)
+    pet = Pet.query.options(*LOADER_PROFILES['pet_detail']).filter_by(id=pet_id).first_or_404()
+    catalog = get_catalog()
+    pokemon = catalog.pokemon_or_404(pet.poke_id)
+    type = catalog.type_or_404(pokemon.type)
+
+    inventory = []
+    if g.user and g.user.id == pet.user_id:
+        inventory = UserBerry.query.options(*LOADER_PROFILES['inventory']).filter_by(user_id=g.user.id).all()
 
-    return render_template('pets/details.html', pet=pet, type=type)
+    return render_template('pets/details.html', pet=pet, pokemon=pokemon, type=type, inventory=inventory)
 
 @app.route('/pets/<int:pet_id>/release-check', methods=["GET", "POST"])
 def release_pet_check(pet_id):
     """Show release form"""
     pet = Pet.query.get_or_404(pet_id)
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
     form = ReleasePet()
@@ -269,7 +425,7 @@ def release_pet_check(pet_id):
 def release_pet(pet_id):
     """Delete Pet"""
     pet= Pet.query.get_or_404(pet_id)
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
 
@@ -283,66 +439,30 @@ def release_pet(pet_id):
 def feed_pet(pet_id):
     """Feeds pet an apple"""
     pet = Pet.query.get_or_404(pet_id)
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
-    
-
-    if pet.hunger == 100:
-        flash(f"{pet.nickname} isn't hungry right now!", "DANGER")
-    
-    else:
-        flash(f"{pet.nickname} crunches on the apple!", "SUCCESS")
-   
-        pet.increase_hunger(10)
-        pet.decrease_happiness(5)
-    
-        db.session.commit()
 
+    flash_all(feed_apple(pet))
+    db.session.commit()
 
     return redirect(f'/pets/{pet.id}')
-@app.route('/feed_pet_berry/<int:pet_id>/<int:item_id>', methods=["POST"])
-def feed_pet_berry(pet_id, item_id):
+
+@app.route('/feed_pet_berry/<int:pet_id>/<int:berry_id>', methods=["POST"])
+def feed_pet_berry(pet_id, berry_id):
     """Feeds pet a berry"""
     pet = Pet.query.get_or_404(pet_id)
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
     
-    item = UserBerry.query.get_or_404(item_id)
-    berry = Berry.query.get_or_404(item.berry_id)
-
-    type = Type.query.get_or_404(pet.pokemon.type)
-
-    if pet.hunger == 100:
-        flash(f"{pet.nickname} isn't hungry!")
-        return redirect(f'/pets/{pet.id}')
-
-    if item.berry_id == type.fav_berry_id:
-        pet.increase_hunger(50)
-        pet.increase_happiness(50)
-        if berry not in pet.berrydex:
-            pet.berrydex.append(berry)
-            db.session.commit()
-        db.session.delete(item)
-        flash(f"{pet.nickname} gobbles up the berry! Delicious!", "SUCCESS")
-       
-
-
-    elif item.berry_id == type.least_fav_berry_id:
-        flash(f"{pet.nickname} spits out the berry! Yuck!", "DANGER")
-        pet.decrease_happiness(20)
-        if berry not in pet.berrydex:
-            pet.berrydex.append(berry)
-            db.session.commit()
-
-    else:
-        flash(f"{pet.nickname} eats the berry. Yum!", "SUCCESS")
-        pet.increase_hunger(15)
-        db.session.delete(item)
+    item = UserBerry.query.get_or_404((g.user.id, berry_id))
+    catalog = get_catalog()
+    berry = catalog.berry_or_404(item.berry_id)
+    type = catalog.type_or_404(catalog.pokemon_or_404(pet.poke_id).type)
 
+    flash_all(feed_berry(pet, g.user.id, berry, type))
     db.session.commit()
-        
 
     return redirect(f'/pets/{pet.id}')
 
@@ -351,25 +471,115 @@ def feed_pet_berry(pet_id, item_id):
 def play_with_pet(pet_id):
     """Alters pet stats based on play action """
     pet = Pet.query.get_or_404(pet_id)
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
-    
 
-    if pet.happiness == 100:
-        flash(f'{pet.nickname} is as happy as can be!', "SUCCESS")
+    flash_all(play_with(pet))
+    db.session.commit()
+
+    return redirect(f'/pets/{pet.id}')
+
+def flash_all(messages):
+    """Flashes (category, message) pairs from a care action"""
+    for category, message in messages:
+        flash(message, category)
 
-    if pet.hunger <= 30:
-        flash(f"{pet.nickname} is too hungry to play!", "DANGER")
-        return redirect(f'/pets/{pet.id}')
-    pet.increase_happiness(10)
-    pet.decrease_hunger(10)
-    flash(f"{pet.nickname}" + f"{random.choice(play_phrases)}", "SUCCESS" )
 
-    db.session.add(pet)
+###### PET API ##########
+# JSON versions of the pet page's stats and care actions. The buttons on
+# pets/details.html use them so an action only sends back what changed
+# instead of redirecting and rendering the whole page again.
+
+def pet_state(pet):
+    return {
+        'id': pet.id,
+        'nickname': pet.nickname,
+        'hunger': pet.current_hunger,
+        'happiness': pet.current_happiness,
+    }
+
+def api_user_pet(pet_id):
+    """Returns (pet, None) for the logged in user's pet, or (None, an
+    error response)"""
+    if not g.user:
+        return None, (jsonify(error="Access unauthorized."), 401)
+    pet = db.session.get(Pet, pet_id)
+    if pet is None:
+        return None, (jsonify(error="Pet not found."), 404)
+    if pet.user_id != g.user.id:
+        return None, (jsonify(error="Access unauthorized."), 403)
+    return pet, None
+
+def api_care_response(pet, before, messages, **extra):
+    """Commits a care action and returns the stats it changed and its
+    messages"""
+    state = pet_state(pet)
+    changed = {stat: state[stat] for stat in ('hunger', 'happiness') if state[stat] != before[stat]}
     db.session.commit()
+    return jsonify(
+        id=pet.id,
+        changed=changed,
+        messages=[{'category': category, 'message': message} for category, message in messages],
+        **extra
+    )
 
-    return redirect(f'/pets/{pet.id}')
+@app.before_request
+def api_json_only():
+    """Care actions must be sent as JSON. Browsers won't send that cross
+    site without a CORS preflight, so a plain form elsewhere can't post
+    to the API with the user's cookie."""
+    if request.path.startswith('/api/') and request.method == 'POST' and not request.is_json:
+        return jsonify(error="Expected a JSON request."), 415
+
+@app.route('/api/v1/pets/<int:pet_id>')
+def api_pet(pet_id):
+    """Current stats of one of the user's pets. Supports If-None-Match;
+    the ETag only changes when a stat does."""
+    pet, error = api_user_pet(pet_id)
+    if error:
+        return error
+    resp = jsonify(pet_state(pet))
+    resp.add_etag()
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@app.route('/api/v1/pets/<int:pet_id>/feed', methods=['POST'])
+def api_feed_pet(pet_id):
+    """Feeds a pet an apple"""
+    pet, error = api_user_pet(pet_id)
+    if error:
+        return error
+    before = pet_state(pet)
+    return api_care_response(pet, before, feed_apple(pet))
+
+@app.route('/api/v1/pets/<int:pet_id>/feed/<int:berry_id>', methods=['POST'])
+def api_feed_pet_berry(pet_id, berry_id):
+    """Feeds a pet one of the user's berries; also returns how many of
+    that berry are left"""
+    pet, error = api_user_pet(pet_id)
+    if error:
+        return error
+    catalog = get_catalog()
+    berry = catalog.berries.get(berry_id)
+    if berry is None or db.session.get(UserBerry, (g.user.id, berry_id)) is None:
+        return jsonify(error="You don't have that berry."), 404
+    type = catalog.type_or_404(catalog.pokemon_or_404(pet.poke_id).type)
+
+    before = pet_state(pet)
+    messages = feed_berry(pet, g.user.id, berry, type)
+    quantity = db.session.query(UserBerry.quantity).filter_by(user_id=g.user.id, berry_id=berry_id).scalar()
+    return api_care_response(pet, before, messages, berry={'id': berry_id, 'quantity': quantity or 0})
+
+@app.route('/api/v1/pets/<int:pet_id>/play', methods=['POST'])
+def api_play_with_pet(pet_id):
+    """Plays with a pet"""
+    pet, error = api_user_pet(pet_id)
+    if error:
+        return error
+    before = pet_state(pet)
+    return api_care_response(pet, before, play_with(pet))
     
 
 #########
@@ -379,8 +589,11 @@ def show_forage():
     if not g.user:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
+    user = g.user.load(LOADER_PROFILES['user_forage'])
+    form = ExpeditionForm()
+    form.pets.choices = [(pet.id, pet.nickname) for pet in user.pets]
    
-    return render_template('forage.html', user=g.user)
+    return render_template('forage.html', user=user, form=form)
 
 @app.route('/foraging/<int:pet_id>', methods=['GET','POST'])
 def go_forage(pet_id):
@@ -388,50 +601,126 @@ def go_forage(pet_id):
 
     pet = Pet.query.get_or_404(pet_id)
    
-    if not g.user or pet.user_id is not g.user.id:
+    if not g.user or pet.user_id != g.user.id:
         flash("Access unauthorized.", "DANGER")
         return redirect('/')
     
-    if pet.hunger <= 10:
+    outcome, result = forage_trip(pet.current_hunger)
+
+    if outcome == 'tired':
         flash(f"{pet.nickname} is too tired to go foraging!", "DANGER")
-        pet.decrease_happiness(5)
+        pet.change_stats(*FORAGE_CHANGES[outcome])
+        db.session.commit()
         return redirect('/foraging')
 
-
-    result = forage()
-
     if result:
         flash(f"{pet.nickname} found a berry!", "SUCCESS")
-        new_berry = UserBerry(
-            user_id= g.user.id,
-            berry_id = result.id
-        )
-        db.session.add(new_berry)
+        UserBerry.add(g.user.id, result.id)
         flash(f"{result.name} berry added to inventory", "SUCCESS")
-        pet.increase_happiness(50)
-        db.session.commit()
     else:
         flash(f"{pet.nickname} didn't find anything!", "DANGER")
-        pet.decrease_happiness(10)
+    pet.change_stats(*FORAGE_CHANGES[outcome])
+
+    db.session.commit()
+
+
+    return redirect('/foraging')
+
+@app.route('/foraging/expedition', methods=['POST'])
+def go_expedition():
+    """Sends several pets foraging at once
+
+    Every trip is rolled in memory, then the berries found are added with
+    one upsert and the stat changes with one UPDATE per outcome, all in a
+    single transaction."""
+    if not g.user:
+        flash("Access unauthorized.", "DANGER")
+        return redirect('/')
 
+    pets = Pet.query.filter_by(user_id=g.user.id).order_by(Pet.id).all()
+    form = ExpeditionForm()
+    form.pets.choices = [(pet.id, pet.nickname) for pet in pets]
+    if not form.validate_on_submit() or not form.pets.data:
+        flash("Pick at least one of your pets to send out.", "DANGER")
+        return redirect('/foraging')
 
-    pet.decrease_hunger(30)
+    chosen = set(form.pets.data)
+    catalog = get_catalog()
+    trips = {outcome: [] for outcome in FORAGE_CHANGES}
+    found = Counter()
+    for pet in pets:
+        if pet.id in chosen:
+            outcome, berry = forage_trip(pet.current_hunger)
+            trips[outcome].append(pet)
+            if berry:
+                found[berry.id] += 1
+
+    UserBerry.add_many(g.user.id, found)
+    for outcome, trip in trips.items():
+        Pet.change_stats_many([pet.id for pet in trip], *FORAGE_CHANGES[outcome])
     db.session.commit()
 
+    if found:
+        berries = ", ".join(f"{count} {catalog.berries[id].name}" for id, count in sorted(found.items()))
+        flash(f"Your pets came home with {berries} berries!", "SUCCESS")
+    if trips['empty']:
+        flash(f"{', '.join(pet.nickname for pet in trips['empty'])} didn't find anything!", "DANGER")
+    if trips['tired']:
+        flash(f"{', '.join(pet.nickname for pet in trips['tired'])} stayed home, too tired to go foraging!", "DANGER")
+
+    return redirect('/foraging')
+
 
-    return redirect(f'/foraging')
+def render_pokedex_page(type, after, seen):
+    """Renders one page of the pokedex"""
+    catalog = get_catalog()
+    pokemon, next_after = catalog.pokemon_page(after, type, POKEDEX_PAGE_SIZE)
+    return render_template('pokedex.html', pokemon=pokemon, seen=seen, type=type,
+                           types=sorted(catalog.pokemon_by_type), next_after=next_after)
+
+
+@lru_cache(maxsize=1024)
+def cached_pokedex_page(version, type, after, user_id, seen):
+    """Rendered pokedex page and its strong ETag, cached per catalog and
+    asset manifest version, page and viewer.
+
+    g.user must be the user with user_id, since the navbar links to their
+    profile. Pages for old catalog versions fall out as new ones are used."""
+    html = render_pokedex_page(type, after, seen)
+    return html, hashlib.sha256(html.encode()).hexdigest()
 
 
 @app.route('/pokedex')
 def pokedex():
-    """Shows list of all potential pets"""
-    pokemon = Pokemon.query.all()
-
-    return render_template('pokedex.html', pokemon=pokemon)
+    """Shows a page of potential pets, optionally of one type"""
+    catalog = get_catalog()
+    type = request.args.get('type') or None
+    after = request.args.get('after', 0, type=int)
+    if type:
+        catalog.type_or_404(type)
+
+    pokemon, _ = catalog.pokemon_page(after, type, POKEDEX_PAGE_SIZE)
+    seen = frozenset()
+    if g.user and pokemon:
+        seen = frozenset(id for (id,) in db.session.query(Pokedex.pokemon_seen_id).filter(
+            Pokedex.user_id == g.user.id,
+            Pokedex.pokemon_seen_id.in_([poke.id for poke in pokemon])))
+
+    if '_flashes' in session:
+        # Flash messages are shown once, so this response can't be cached.
+        return render_pokedex_page(type, after, seen)
+
+    user_id = g.user.id if g.user else None
+    html, etag = cached_pokedex_page((catalog.version, assets.manifest.version), type, after, user_id, seen)
+    resp = app.make_response(html)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
     
 
 @app.route('/pets')
 def random_pets():
     """ Show a random assortment of existing user pets"""
-    pets = Pet.query.limit(15).all()
+    pets = Pet.random_sample(15, LOADER_PROFILES['pet_showcase'])
     return render_template('pets/random.html', pets=pets)
\ No newline at end of file
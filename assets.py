@@ -0,0 +1,227 @@
+import glob
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, send_from_directory, url_for
+
+from compression import ENCODINGS, SUFFIXES, compress_static, negotiate
+from files import write_atomic
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Fingerprinted files are written under static/<BUILD_DIR>, which isn't
+# checked in; manifest.json there maps logical names to them.
+BUILD_DIR = 'build'
+
+# Bump when the manifest layout changes; manifests written with another
+# version are ignored and rebuilt.
+MANIFEST_VERSION = 2
+
+# A fingerprinted URL changes whenever the file does, so browsers may
+# keep it for a year without revalidating.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Checked-in files under static/ that `flask assets` fingerprints.
+BUNDLED = ('app.css', 'images/berries/*.png')
+
+# Fingerprinted files of these types also get gzip and brotli copies next
+# to them. PNG and WebP are compressed already and gain nothing.
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.html')
+
+# A precompressed copy is only kept if it's at most this share of the
+# original's size.
+PRECOMPRESS_MAX_RATIO = 0.9
+
+
+def fingerprint(data):
+    """Short content hash used in fingerprinted file names"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fingerprinted_name(logical, data):
+    """'sprites/1-96.webp' -> 'sprites/1-96.<hash>.webp'"""
+    root, ext = os.path.splitext(logical)
+    return f'{root}.{fingerprint(data)}{ext}'
+
+
+class AssetManifest:
+    """Maps logical asset names to fingerprinted files under static/.
+
+    Build steps add() files and save(); app workers look names up with
+    url(). A worker picks up a rebuilt manifest on its next request, and
+    old fingerprinted files are left in place so pages already rendered
+    with them keep working."""
+
+    def __init__(self, static_dir=None):
+        self.static_dir = static_dir or STATIC_DIR
+        self.version = 0
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._assets = {}
+        self._sources = {}
+        self._encodings = {}
+        self._built = frozenset()
+
+    @property
+    def path(self):
+        return os.path.join(self.static_dir, BUILD_DIR, 'manifest.json')
+
+    def refresh(self):
+        """Reloads the manifest if the file changed since it was read"""
+        path = self.path
+        try:
+            loaded = path, os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            loaded = path, None
+        if loaded == self._loaded:
+            return
+        with self._lock:
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            if data.get('version') != MANIFEST_VERSION:
+                data = {}
+            self._assets = data.get('assets', {})
+            self._sources = data.get('sources', {})
+            self._encodings = data.get('encodings', {})
+            self._built = frozenset(self._assets.values())
+            self._loaded = loaded
+            self.version += 1
+
+    def get(self, logical):
+        """Path under static/ of the fingerprinted file for logical, or None"""
+        return self._assets.get(logical)
+
+    def url(self, logical):
+        """URL of the fingerprinted file for logical, or None if it hasn't
+        been built"""
+        built = self._assets.get(logical)
+        return url_for('static', filename=built) if built else None
+
+    def is_fingerprinted(self, filename):
+        return filename in self._built
+
+    def encodings(self, filename):
+        """Encodings a precompressed copy of a built file exists in"""
+        return self._encodings.get(filename, ())
+
+    def source_digest(self, source):
+        """Digest recorded for a build input, to skip unchanged inputs"""
+        return self._sources.get(source)
+
+    def add(self, logical, data, source=None, source_digest=None):
+        """Writes data under its fingerprinted name and records it.
+
+        The file is only written if it doesn't exist yet, and text files
+        get precompressed copies. Call save() to publish the new
+        entries."""
+        built = f'{BUILD_DIR}/{fingerprinted_name(logical, data)}'
+        path = os.path.join(self.static_dir, built)
+        if not os.path.exists(path):
+            write_atomic(path, data)
+        encodings = []
+        if os.path.splitext(logical)[1] in PRECOMPRESS_EXTENSIONS:
+            encodings = self._precompress(path, data)
+        with self._lock:
+            self._assets[logical] = built
+            if encodings:
+                self._encodings[built] = encodings
+            else:
+                self._encodings.pop(built, None)
+            if source is not None:
+                self._sources[source] = source_digest
+        return built
+
+    def _precompress(self, path, data):
+        encodings = []
+        for encoding in ENCODINGS:
+            variant = path + SUFFIXES[encoding]
+            if not os.path.exists(variant):
+                compressed = compress_static(data, encoding)
+                if len(compressed) > len(data) * PRECOMPRESS_MAX_RATIO:
+                    continue
+                write_atomic(variant, compressed)
+            encodings.append(encoding)
+        return encodings
+
+    def save(self):
+        with self._lock:
+            self._built = frozenset(self._assets.values())
+            data = {
+                'version': MANIFEST_VERSION,
+                'assets': dict(sorted(self._assets.items())),
+                'sources': dict(sorted(self._sources.items())),
+                'encodings': {built: encodings for built, encodings in sorted(self._encodings.items())
+                              if built in self._built},
+            }
+            write_atomic(self.path, json.dumps(data, indent=1).encode())
+            self._loaded = self.path, os.stat(self.path).st_mtime_ns
+            self.version += 1
+
+
+manifest = AssetManifest()
+
+
+def build_bundled(assets=manifest, patterns=BUNDLED):
+    """Adds fingerprinted copies of the checked-in static files to the
+    manifest. Returns the number of files."""
+    paths = sorted({path for pattern in patterns for path in glob.glob(os.path.join(assets.static_dir, pattern))})
+    for path in paths:
+        with open(path, 'rb') as f:
+            assets.add(os.path.relpath(path, assets.static_dir).replace(os.sep, '/'), f.read())
+    assets.save()
+    return len(paths)
+
+
+def static_url(filename, assets=manifest):
+    """URL for a file under static/: its fingerprinted copy once `flask
+    assets` has built one, otherwise the file itself. Absolute URLs, like
+    berry images from before they were bundled, are returned as they are."""
+    if filename.startswith(('/', 'http://', 'https://')):
+        return filename
+    return assets.url(filename) or url_for('static', filename=filename)
+
+
+def init_app(app, assets=manifest):
+    """Adds asset_url() and static_url() to templates and far-future cache
+    headers to fingerprinted static files"""
+
+    @app.before_request
+    def refresh_assets():
+        assets.refresh()
+
+    @app.before_request
+    def serve_precompressed():
+        """Sends the precompressed copy of a built file the client
+        accepts best, so static files are never compressed per request"""
+        if request.endpoint != 'static':
+            return None
+        filename = request.view_args.get('filename')
+        encoding = negotiate(request.headers.get('Accept-Encoding'), assets.encodings(filename))
+        if encoding is None:
+            return None
+        resp = send_from_directory(app.static_folder, filename + SUFFIXES[encoding],
+                                   mimetype=mimetypes.guess_type(filename)[0])
+        resp.headers['Content-Encoding'] = encoding
+        return resp
+
+    @app.after_request
+    def cache_fingerprinted(resp):
+        filename = request.view_args.get('filename') if request.endpoint == 'static' else None
+        if assets.is_fingerprinted(filename):
+            resp.cache_control.public = True
+            resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+            resp.cache_control.immutable = True
+            resp.cache_control.no_cache = None
+        if assets.encodings(filename):
+            resp.vary.add('Accept-Encoding')
+        return resp
+
+    app.jinja_env.globals['asset_url'] = assets.url
+    app.jinja_env.globals['static_url'] = lambda filename: static_url(filename, assets)
+    assets.refresh()
@@ -0,0 +1,73 @@
+from flask import abort, redirect, session, url_for
+
+from models import User
+
+CURR_USER_KEY = "curr_user"
+CURR_USERNAME_KEY = "curr_username"
+
+
+class LazyUser:
+    """Stands in for the logged in User until something needs the row.
+
+    id and username are cached in the signed session, so requests that only
+    need those never query the users table. Any other attribute loads the
+    User once and is read from (or written to) it."""
+
+    def __init__(self, id, username=None):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, '_username', username)
+        object.__setattr__(self, '_user', None)
+
+    def load(self, options=()):
+        """Loads the User row with the given loader options and caches it.
+
+        If the user has been deleted the session is logged out and the
+        request is sent to the login page."""
+        user = User.query.options(*options).filter_by(id=self.id).first()
+        if user is None:
+            session.pop(CURR_USER_KEY, None)
+            session.pop(CURR_USERNAME_KEY, None)
+            abort(redirect(url_for('login')))
+        object.__setattr__(self, '_user', user)
+        return user
+
+    def _get_current_object(self):
+        """Returns the User row, loading it on first use"""
+        if self._user is None:
+            return self.load()
+        return self._user
+
+    @property
+    def username(self):
+        if self._username is None:
+            object.__setattr__(self, '_username', self._get_current_object().username)
+        return self._username
+
+    def __getattr__(self, name):
+        return getattr(self._get_current_object(), name)
+
+    def __setattr__(self, name, value):
+        if name == 'username':
+            object.__setattr__(self, '_username', value)
+        setattr(self._get_current_object(), name, value)
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, (User, LazyUser)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((User, self.id))
+
+    def __repr__(self):
+        return f"<LazyUser #{self.id}>"
+
+
+def current_user():
+    """Builds g.user from the session without touching the database"""
+    if CURR_USER_KEY in session:
+        return LazyUser(session[CURR_USER_KEY], session.get(CURR_USERNAME_KEY))
+    return None
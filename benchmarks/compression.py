@@ -0,0 +1,65 @@
+"""Measures bytes on the wire and CPU per request with compression.
+
+Requests each page --requests times through the app, logged out, once
+per Accept-Encoding: none, gzip and brotli. Reports the body size and the
+CPU time per request, and how much of that the streaming compression
+adds over sending the page uncompressed. Then does the same for the
+precompressed static files, which should cost no more than sending
+them as they are.
+
+Uses the database in DATABASE_URL, which must already be seeded, and
+the files built by `flask assets` and `flask sprites`.
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.compression --requests 200
+"""
+import argparse
+import time
+
+from app import app
+import assets
+
+ACCEPT = (('identity', None), ('gzip', 'gzip'), ('br', 'gzip, deflate, br'))
+
+
+def measure(client, path, accept, requests):
+    """(body bytes, CPU ms per request)"""
+    headers = {'Accept-Encoding': accept} if accept else {}
+    client.get(path, headers=headers).close()
+    start = time.process_time()
+    for _ in range(requests):
+        resp = client.get(path, headers=headers)
+        body = resp.get_data()
+        resp.close()
+    return len(body), (time.process_time() - start) * 1000 / requests
+
+
+def report(client, paths, requests):
+    print(f"{'path':<34} {'encoding':<9} {'bytes':>8} {'ratio':>6} {'cpu ms':>7} {'+cpu ms':>8}")
+    for path in paths:
+        plain = None
+        for label, accept in ACCEPT:
+            size, cpu = measure(client, path, accept, requests)
+            plain = plain or (size, cpu)
+            print(f"{path[-34:]:<34} {label:<9} {size:>8,} {size / plain[0]:>6.1%} {cpu:>7.2f} "
+                  f"{cpu - plain[1]:>+8.2f}")
+
+
+def run(paths, requests):
+    client = app.test_client()
+    assets.manifest.refresh()
+    report(client, paths, requests)
+
+    with app.test_request_context():
+        static = [assets.static_url(name) for name in ('app.css', 'atlas/sprites.css')
+                  if assets.manifest.get(name)]
+    if static:
+        print()
+        report(client, static, requests)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', action='append', help="page to request (repeatable)")
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    run(args.path or ['/pokedex', '/pokedex?after=60', '/pets', '/'], args.requests)
@@ -0,0 +1,77 @@
+"""Compares serial and concurrent PokeAPI ingestion against a local stub.
+
+The stub answers /api/v2/pokemon/<id> with a small pokemon payload after a
+fixed delay, standing in for the round trip to pokeapi.co.
+
+Run from the repo root:
+
+    python -m benchmarks.ingest --count 150 --latency 0.05 --workers 8
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pokeapi import fetch_all_pokemon
+
+
+def stub_pokemon(id):
+    """Builds a payload shaped like the fields we read from the real API"""
+    return {
+        'id': id,
+        'name': f'pokemon-{id}',
+        'base_experience': 64,
+        'sprites': {'other': {'official-artwork': {
+            'front_default': f'https://example.com/{id}.png'}}},
+        'types': [{'slot': 1, 'type': {'name': 'normal'}}]
+    }
+
+
+def start_stub_server(latency):
+    """Starts the stub API on a free local port, returns (server, base_url)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = json.dumps(stub_pokemon(int(self.path.rstrip('/').rsplit('/', 1)[-1]))).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/api/v2/pokemon/'
+
+
+def run(count, latency, workers):
+    server, base_url = start_stub_server(latency)
+    ids = range(1, count + 1)
+    try:
+        results = {}
+        for label, n in (('serial', 1), ('concurrent', workers)):
+            start = time.perf_counter()
+            data = fetch_all_pokemon(ids, workers=n, base_url=base_url, mode='live')
+            results[label] = time.perf_counter() - start
+            assert [d['id'] for d in data] == list(ids)
+            print(f'{label:>10}: {results[label]:7.3f}s  ({count / results[label]:8.1f} req/s, workers={n})')
+        print(f'{"speedup":>10}: {results["serial"] / results["concurrent"]:7.1f}x')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=150)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub delay per request, seconds')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    run(args.count, args.latency, args.workers)
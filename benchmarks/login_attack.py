@@ -0,0 +1,103 @@
+"""Shows the login throttle keeping CPU use bounded during an attack.
+
+Serves the app from a threaded local server and runs a credential-stuffing
+client in a separate process: --clients threads posting wrong passwords
+for one real user and for random usernames. Each phase reports the server
+process's CPU use (process time / wall time), attempts handled, CPU per
+attempt and the throttle's counters, first with the throttle effectively
+off and then with the configured limits.
+
+Uses the database in DATABASE_URL, which must already be seeded. A
+throwaway user is created and removed afterwards.
+
+Run from the repo root:
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.login_attack --clients 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+import uuid
+
+import requests
+from werkzeug.serving import make_server
+
+from app import app, login_throttle
+from benchmarks.login_storm import QuietHandler
+from models import db, User
+from throttle import Limit
+
+USERNAME = 'login-attack'
+
+
+def attack(base_url, clients, seconds, attempts):
+    """Posts bad logins from clients threads for seconds"""
+    deadline = time.monotonic() + seconds
+
+    def client(n):
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                # Half the attempts target the real user, half spray usernames.
+                username = USERNAME if n % 2 == 0 else uuid.uuid4().hex[:12]
+                session.post(f'{base_url}/login', data={'username': username, 'password': 'not-the-password'},
+                             allow_redirects=False)
+                with attempts.get_lock():
+                    attempts.value += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_phase(base_url, clients, seconds):
+    """Returns (server CPU share, attempts per second, throttle counts)"""
+    login_throttle.counts.clear()
+    attempts = multiprocessing.Value('i', 0)
+    attacker = multiprocessing.Process(target=attack, args=(base_url, clients, seconds, attempts))
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    attacker.start()
+    attacker.join()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return cpu / wall, attempts.value / wall, dict(login_throttle.counts)
+
+
+def run(clients, seconds):
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        User.query.filter_by(username=USERNAME).delete()
+        User.signup(username=USERNAME, password='the-real-password', email=f'{USERNAME}@example.com')
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    limits = (login_throttle.user_limit, login_throttle.ip_limit)
+    unlimited = Limit(10 ** 9, 10 ** 9)
+
+    print(f"{'phase':<14} {'server cpu':>10} {'attempts/s':>11} {'cpu ms/att':>11} "
+          f"{'allowed':>8} {'rej. ip':>8} {'rej. user':>10}")
+    try:
+        for label, (user_limit, ip_limit) in (('throttle off', (unlimited, unlimited)), ('throttle on', limits)):
+            login_throttle.user_limit, login_throttle.ip_limit = user_limit, ip_limit
+            share, rate, counts = run_phase(base_url, clients, seconds)
+            print(f"{label:<14} {share:>10.0%} {rate:>11.1f} {share * 1000 / max(rate, 1e-9):>11.2f} "
+                  f"{counts.get('allowed', 0):>8} "
+                  f"{counts.get('rejected_ip', 0):>8} {counts.get('rejected_user', 0):>10}")
+    finally:
+        login_throttle.user_limit, login_throttle.ip_limit = limits
+        server.shutdown()
+        with app.app_context():
+            User.query.filter_by(username=USERNAME).delete()
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help="attacking threads")
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    run(args.clients, args.seconds)
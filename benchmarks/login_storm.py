@@ -0,0 +1,110 @@
+"""Measures login throughput and other routes' latency during a login storm.
+
+Serves the app from a threaded local server, then hammers POST /login from
+--clients threads while a probe thread times GET /pokedex. It runs once
+with bcrypt bounded to --workers hashes at a time, and once with as many
+hash workers as clients (the unbounded case). The probe also runs with no
+storm as a baseline.
+
+Uses the database in DATABASE_URL, which must already be seeded. A
+throwaway user is created and removed afterwards.
+
+Run from the repo root:
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.login_storm --clients 16 --workers 2 --seconds 10
+"""
+import argparse
+import threading
+import time
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import app
+from models import db, User
+from passwords import reset_executor
+
+USERNAME = 'login-storm'
+PASSWORD = 'login-storm-password'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000 if values else float('nan')
+
+
+def probe(base_url, stop, latencies):
+    """Times GET /pokedex until stop is set"""
+    with requests.Session() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            session.get(f'{base_url}/pokedex')
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.05)
+
+
+def storm(base_url, stop, logins):
+    """Logs in over and over until stop is set"""
+    with requests.Session() as session:
+        while not stop.is_set():
+            resp = session.post(f'{base_url}/login', data={'username': USERNAME, 'password': PASSWORD},
+                                allow_redirects=False)
+            if resp.status_code == 302 and resp.headers['Location'] == '/':
+                logins.append(1)
+
+
+def run_phase(base_url, clients, seconds):
+    """Returns (logins per second, probe latencies) for one phase"""
+    stop = threading.Event()
+    latencies, logins = [], []
+    threads = [threading.Thread(target=probe, args=(base_url, stop, latencies))]
+    threads += [threading.Thread(target=storm, args=(base_url, stop, logins)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return len(logins) / seconds, latencies
+
+
+def run(clients, workers, seconds):
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        User.query.filter_by(username=USERNAME).delete()
+        User.signup(username=USERNAME, password=PASSWORD, email=f'{USERNAME}@example.com')
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    print(f"{'phase':<22} {'logins/s':>9} {'pokedex p50 ms':>15} {'p95 ms':>8}")
+    try:
+        for label, hash_workers, storm_clients in (
+                ('no storm', workers, 0),
+                (f'bounded ({workers} workers)', workers, clients),
+                (f'unbounded ({clients})', clients, clients)):
+            app.config['BCRYPT_WORKERS'] = hash_workers
+            reset_executor()
+            rate, latencies = run_phase(base_url, storm_clients, seconds)
+            print(f"{label:<22} {rate:>9.1f} {percentile(latencies, 50):>15.1f} {percentile(latencies, 95):>8.1f}")
+    finally:
+        server.shutdown()
+        with app.app_context():
+            User.query.filter_by(username=USERNAME).delete()
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16, help="threads logging in at once")
+    parser.add_argument('--workers', type=int, default=2, help="bcrypt workers in the bounded phase")
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    run(args.clients, args.workers, args.seconds)
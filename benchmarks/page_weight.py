@@ -0,0 +1,79 @@
+"""Measures the bytes a browser downloads for a pokedex page.
+
+Renders /pokedex (logged out, so every sprite is shown) once with the
+remote artwork URLs and once with the local thumbnails and atlas, and
+adds up the HTML plus every image and stylesheet the sprites need: what
+each <img> or <picture> would fetch, and each atlas sheet once. Remote artwork
+is sized from the originals in SPRITE_SOURCE_DIR, which are the same
+files; images that are neither local nor there are counted as unknown.
+
+Uses the database in DATABASE_URL, which must already be seeded, and
+the thumbnails from `flask sprites`.
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.page_weight
+"""
+import argparse
+import os
+import re
+import tempfile
+from urllib.parse import urlparse
+
+from app import app, cached_pokedex_page
+from sprites import original_path, ATLAS_STYLESHEET
+import assets
+
+IMAGE = re.compile(r'<picture><source srcset="([^"]+)"|<img[^>]* src="([^"]+)"')
+SHEET = re.compile(r'class="sprite sprite-sheet-(\d+)')
+
+
+def asset_bytes(url):
+    """Size of the file behind a URL, or None if unknown"""
+    path = urlparse(url).path
+    if path.startswith('/static/'):
+        return os.path.getsize(os.path.join(app.static_folder, path[len('/static/'):]))
+    match = re.search(r'/(\d+)\.png$', path)
+    if match and os.path.exists(original_path(match.group(1))):
+        return os.path.getsize(original_path(match.group(1)))
+    return None
+
+
+def page_weight(client, path):
+    """(html bytes, asset bytes, requests, unknown sizes) for one page"""
+    cached_pokedex_page.cache_clear()
+    html = client.get(path).get_data(as_text=True)
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    # A <picture> fetches its first source and skips the <img> inside it.
+    html = re.sub(r'(<picture><source srcset="[^"]+"[^>]*>)<img[^>]*>', r'\1', html)
+    urls = [webp or src for webp, src in IMAGE.findall(html)]
+    sheets = sorted(set(SHEET.findall(html)))
+    if sheets:
+        with app.test_request_context():
+            urls.append(assets.manifest.url(ATLAS_STYLESHEET))
+            urls += [assets.manifest.url(f'atlas/sheet-{sheet}.webp') for sheet in sheets]
+    sizes = [asset_bytes(url) for url in urls]
+    known = [size for size in sizes if size is not None]
+    return len(html.encode()), sum(known), len(urls), len(sizes) - len(known)
+
+
+def run(path):
+    client = app.test_client()
+    static_dir = assets.manifest.static_dir
+
+    print(f"{'sprites':<8} {'html KiB':>9} {'requests':>9} {'asset KiB':>10} {'unknown':>8} {'total KiB':>10}")
+    with tempfile.TemporaryDirectory() as empty:
+        try:
+            # With no manifest every sprite falls back to its remote URL.
+            for label, directory in (('remote', empty), ('local', static_dir)):
+                assets.manifest.static_dir = directory
+                html, images, count, unknown = page_weight(client, path)
+                print(f"{label:<8} {html / 1024:>9.1f} {count:>9} {images / 1024:>10.1f} {unknown:>8} "
+                      f"{(html + images) / 1024:>10.1f}")
+        finally:
+            assets.manifest.static_dir = static_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/pokedex', help="page to weigh")
+    args = parser.parse_args()
+    run(args.path)
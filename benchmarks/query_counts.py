@@ -0,0 +1,76 @@
+"""Counts the SQL queries each page issues for a logged in user.
+
+Uses the database in DATABASE_URL, which must already be seeded. A
+throwaway user with a pet and a berry is created and removed afterwards.
+
+Run from the repo root:
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.query_counts
+"""
+import re
+from collections import Counter
+
+from sqlalchemy import event
+
+from app import app, CURR_USER_KEY, CURR_USERNAME_KEY
+from models import db, User, Pet, UserBerry
+
+ROUTES = [
+    '/', '/pokedex', '/pets', '/pets/adopt', '/foraging',
+    '/users/{user_id}', '/users/edit', '/pets/{pet_id}', '/does-not-exist',
+]
+
+
+def count_queries(client, path):
+    """Returns (total queries, queries touching the users table) for a GET"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    user_queries = [s for s in statements if re.search(r'\bFROM users\b', s)]
+    return len(statements), len(user_queries)
+
+
+def run():
+    with app.app_context():
+        user = User(username='query-counts', email='query-counts@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        pet = Pet(nickname='query-counts', user_id=user.id, poke_id=1)
+        db.session.add_all([pet, UserBerry(user_id=user.id, berry_id=1)])
+        db.session.commit()
+        ids = {'user_id': user.id, 'pet_id': pet.id}
+
+    totals = Counter()
+    try:
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = ids['user_id']
+                session[CURR_USERNAME_KEY] = 'query-counts'
+            client.get('/')  # warm the catalog and connection pool
+
+            print(f"{'route':<20} {'queries':>8} {'users':>6}")
+            for route in ROUTES:
+                path = route.format(**ids)
+                total, users = count_queries(client, path)
+                totals['queries'] += total
+                totals['users'] += users
+                print(f"{route:<20} {total:>8} {users:>6}")
+            print(f"{'total':<20} {totals['queries']:>8} {totals['users']:>6}")
+    finally:
+        with app.app_context():
+            for model in (Pet, UserBerry, User):
+                column = model.id if model is User else model.user_id
+                model.query.filter(column == ids['user_id']).delete()
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,57 @@
+"""Times picking random pets for the /pets showcase as the table grows.
+
+Uses the database in DATABASE_URL, which must already be seeded. For each
+size a throwaway user gets that many pets. Pet.random_sample is timed
+against ORDER BY random(), and the pets are removed afterwards. ORDER BY
+random() is skipped above --scan-limit pets because it reads the whole
+table.
+
+Run from the repo root:
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.random_pets --pets 10000 100000 1000000 10000000
+"""
+import argparse
+import time
+
+from sqlalchemy import func
+
+from app import app
+from benchmarks.ticks import make_pets, drop_pets
+from models import db, Pet
+
+SAMPLE_SIZE = 15
+
+
+def time_ms(fn, repeat):
+    """Mean milliseconds per call over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+        db.session.rollback()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(sizes, repeat, scan_limit):
+    print(f"{'pets':>10} {'random_key ms':>14} {'order by random() ms':>21}")
+    for size in sizes:
+        user_id = make_pets(size, username='random-bench')
+        try:
+            with app.app_context():
+                sample = time_ms(lambda: Pet.random_sample(SAMPLE_SIZE), repeat)
+                if size <= scan_limit:
+                    scan = time_ms(lambda: Pet.query.order_by(func.random()).limit(SAMPLE_SIZE).all(), repeat)
+                    scan = f"{scan:>21.2f}"
+                else:
+                    scan = f"{'skipped':>21}"
+            print(f"{size:>10} {sample:>14.2f} {scan}")
+        finally:
+            drop_pets(user_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--scan-limit', type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.pets, args.repeat, args.scan_limit)
@@ -0,0 +1,61 @@
+"""Compares alias-table sampling with naive cumulative-weight sampling.
+
+Times single weighted draws from catalogs of several sizes. The naive
+sampler walks the cumulative weights on every draw (O(n)); random.choices
+bisects precomputed cumulative weights (O(log n)); the alias table is
+O(1). No database is needed.
+
+Run from the repo root:
+
+    python -m benchmarks.rarity --sizes 150 1000 10000 --draws 100000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from catalog import AliasTable
+
+
+def naive_draw(items, weights, rng):
+    """Draws one item by scanning the running total of the weights"""
+    point = rng.random() * sum(weights)
+    for item, cumulative in zip(items, itertools.accumulate(weights)):
+        if point < cumulative:
+            return item
+    return items[-1]
+
+
+def time_draws(draw, count):
+    """Returns microseconds per draw"""
+    start = time.perf_counter()
+    for _ in range(count):
+        draw()
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+def run(sizes, draws):
+    rng = random.Random(0)
+    print(f"{'items':>8} {'naive us':>10} {'bisect us':>10} {'alias us':>10} {'build ms':>9}")
+    for size in sizes:
+        items = list(range(1, size + 1))
+        weights = [rng.uniform(0.2, 1.5) for _ in items]
+        cum_weights = list(itertools.accumulate(weights))
+
+        start = time.perf_counter()
+        table = AliasTable(items, weights)
+        build = (time.perf_counter() - start) * 1000
+
+        # The naive sampler is slow on big catalogs; fewer draws keep the run short.
+        naive = time_draws(lambda: naive_draw(items, weights, rng), max(draws * 150 // size, 1000))
+        bisect = time_draws(lambda: rng.choices(items, cum_weights=cum_weights)[0], draws)
+        alias = time_draws(lambda: table.draw(rng), draws)
+        print(f"{size:>8} {naive:>10.2f} {bisect:>10.2f} {alias:>10.2f} {build:>9.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[150, 1000, 10000])
+    parser.add_argument('--draws', type=int, default=100000)
+    args = parser.parse_args()
+    run(args.sizes, args.draws)
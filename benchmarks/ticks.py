@@ -0,0 +1,84 @@
+"""Measures tick engine throughput (pets updated per second).
+
+Uses the database in DATABASE_URL, which must already be seeded. For each
+size a throwaway user gets that many pets, a tick runs once in one process
+and once split across --workers processes, and the pets are removed
+afterwards.
+
+Run from the repo root:
+
+    DATABASE_URL=postgresql:///pokepets python -m benchmarks.ticks --pets 1000000 10000000 --workers 4
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import text
+
+from app import app
+from models import db, User, Pet
+from ticks import apply_tick, new_tick_id, DEFAULT_CHUNK_SIZE
+
+USERNAME = 'tick-bench'
+
+
+def make_pets(count, username=USERNAME):
+    """Creates a benchmark user with count pets, returns the user id"""
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        db.session.execute(text(
+            "INSERT INTO pets (nickname, user_id, poke_id, hunger, happiness) "
+            "SELECT 'bench-' || i, :user_id, 1 + i % 15, 50, 50 FROM generate_series(1, :count) i"
+        ), {'user_id': user.id, 'count': count})
+        db.session.commit()
+        db.session.execute(text("ANALYZE pets"))
+        db.session.commit()
+        return user.id
+
+
+def drop_pets(user_id):
+    with app.app_context():
+        Pet.query.filter_by(user_id=user_id).delete()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+def run_worker(tick_id, hunger, chunk_size, workers, worker):
+    with app.app_context():
+        # Don't reuse connections inherited from the parent process.
+        db.engine.dispose(close=False)
+        return apply_tick(db, hunger=hunger, chunk_size=chunk_size, workers=workers, worker=worker,
+                          tick_id=tick_id).rows
+
+
+def run_tick(chunk_size, workers):
+    """Runs one tick over all pets, returns (rows, seconds)"""
+    tick_id = new_tick_id()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_worker, tick_id, -1, chunk_size, workers, worker) for worker in range(workers)]
+        rows = sum(future.result() for future in futures)
+    return rows, time.perf_counter() - start
+
+
+def run(sizes, chunk_size, workers):
+    print(f"{'pets':>10} {'workers':>8} {'seconds':>8} {'rows/s':>12}")
+    for size in sizes:
+        user_id = make_pets(size)
+        try:
+            for n in sorted({1, workers}):
+                rows, seconds = run_tick(chunk_size, n)
+                print(f"{rows:>10} {n:>8} {seconds:>8.2f} {rows / seconds:>12,.0f}")
+        finally:
+            drop_pets(user_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    run(args.pets, args.chunk_size, args.workers)
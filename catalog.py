@@ -0,0 +1,190 @@
+import bisect
+import random
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import abort
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Pokemon, Type, Berry, CatalogVersion
+
+# Seconds a worker trusts its catalog before reading the shared version
+# again, so a seed reaches every worker within this long.
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class PokemonRecord(namedtuple('PokemonRecord', 'id name sprite_url type hunger_decay happiness_decay rarity_weight')):
+    """Read-only copy of a Pokemon row"""
+    __slots__ = ()
+
+    def pokedex_id(self):
+        return (f"{self.id:03d}")
+
+
+TypeRecord = namedtuple('TypeRecord', 'name fav_berry_id least_fav_berry_id')
+
+BerryRecord = namedtuple('BerryRecord', 'id name img_url')
+
+
+class AliasTable:
+    """Walker alias table for drawing items in proportion to their weights.
+
+    Building it is O(n); each draw is O(1): pick a column uniformly, then
+    either keep it or take its alias."""
+
+    def __init__(self, items, weights):
+        self.items = tuple(items)
+        n = len(self.items)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights] if total else [1.0] * n
+        self.drawable = sum(1 for p in scaled if p > 0)
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random):
+        """Returns one item, chosen by weight"""
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+    def sample(self, k, rng=random):
+        """Returns up to k distinct items, each drawn by weight from those
+        not yet picked"""
+        k = min(k, self.drawable)
+        picked = []
+        while len(picked) < k:
+            item = self.draw(rng)
+            if item not in picked:
+                picked.append(item)
+        return picked
+
+
+class Catalog:
+    """Immutable snapshot of the pokemon, type and berry tables.
+
+    These tables only change when seeding, so each worker keeps one
+    snapshot in memory and the hot routes read from it instead of the
+    database."""
+
+    def __init__(self, version, pokemon, types, berries):
+        self.version = version
+        self.pokemon = MappingProxyType({poke.id: poke for poke in sorted(pokemon)})
+        self.pokemon_ids = tuple(self.pokemon)
+        self.types = MappingProxyType({type.name: type for type in types})
+        self.berries = MappingProxyType({berry.id: berry for berry in sorted(berries)})
+
+        by_type = {}
+        for poke in self.pokemon.values():
+            by_type.setdefault(poke.type, []).append(poke)
+        self.pokemon_by_type = MappingProxyType({name: tuple(pokes) for name, pokes in by_type.items()})
+        self._ids_by_type = {name: tuple(poke.id for poke in pokes) for name, pokes in by_type.items()}
+
+        # Adoption offers draw pokemon ids by rarity weight.
+        self.rarity = AliasTable(self.pokemon_ids, [poke.rarity_weight for poke in self.pokemon.values()])
+
+    @classmethod
+    def from_database(cls, version=0):
+        """Loads a snapshot with one query per table"""
+        session = db.session
+        return cls(
+            version,
+            pokemon=[PokemonRecord(*row) for row in session.query(
+                Pokemon.id, Pokemon.name, Pokemon.sprite_url, Pokemon.type,
+                Pokemon.hunger_decay, Pokemon.happiness_decay, Pokemon.rarity_weight)],
+            types=[TypeRecord(*row) for row in session.query(
+                Type.name, Type.fav_berry_id, Type.least_fav_berry_id)],
+            berries=[BerryRecord(*row) for row in session.query(
+                Berry.id, Berry.name, Berry.img_url)]
+        )
+
+    def pokemon_page(self, after=0, type=None, limit=60):
+        """Returns (records, next_after) for the pokemon after the given id,
+        optionally only those of one type.
+
+        next_after is the id to pass as after for the next page, or None
+        on the last page."""
+        if type:
+            ids = self._ids_by_type.get(type, ())
+        else:
+            ids = self.pokemon_ids
+        start = bisect.bisect_right(ids, after)
+        page = tuple(self.pokemon[id] for id in ids[start:start + limit])
+        next_after = page[-1].id if start + limit < len(ids) else None
+        return page, next_after
+
+    def pokemon_or_404(self, id):
+        try:
+            return self.pokemon[id]
+        except KeyError:
+            abort(404)
+
+    def type_or_404(self, name):
+        try:
+            return self.types[name]
+        except KeyError:
+            abort(404)
+
+    def berry_or_404(self, id):
+        try:
+            return self.berries[id]
+        except KeyError:
+            abort(404)
+
+
+_catalog = None
+_checked = None
+_lock = threading.Lock()
+
+
+def stored_version():
+    """The catalog version the last seed committed, or 0 before any"""
+    return db.session.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def get_catalog():
+    """Returns this worker's catalog, loading it on first use and again
+    once the shared version has moved. The version is read at most every
+    VERSION_CHECK_INTERVAL seconds. Needs an app context when it has to
+    check or load."""
+    global _catalog, _checked
+    catalog, checked = _catalog, _checked
+    if catalog is not None and checked is not None and time.monotonic() - checked < VERSION_CHECK_INTERVAL:
+        return catalog
+    with _lock:
+        if _catalog is None or _checked is None or time.monotonic() - _checked >= VERSION_CHECK_INTERVAL:
+            version = stored_version()
+            if _catalog is None or _catalog.version != version:
+                _catalog = Catalog.from_database(version)
+            _checked = time.monotonic()
+        return _catalog
+
+
+def bump_version():
+    """Moves the shared catalog version on in the caller's transaction.
+
+    Seeding calls this before it commits; this worker reloads on its next
+    get_catalog() and the others within VERSION_CHECK_INTERVAL."""
+    global _catalog, _checked
+    version = db.session.execute(
+        insert(CatalogVersion)
+        .values(id=1, version=1)
+        .on_conflict_do_update(index_elements=['id'], set_={'version': CatalogVersion.version + 1})
+        .returning(CatalogVersion.version)
+    ).scalar()
+    with _lock:
+        _catalog, _checked = None, None
+    return version
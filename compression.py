@@ -0,0 +1,193 @@
+import gzip
+import zlib
+from itertools import chain
+
+import brotli
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+# Encodings we can produce, most preferred first when the client rates
+# them equally.
+ENCODINGS = ('br', 'gzip')
+
+# File name suffix of a precompressed copy in each encoding.
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Responses smaller than this are sent as they are; below about one
+# packet compression saves nothing on the wire.
+DEFAULT_MIN_SIZE = 1024
+
+# Levels for compressing at request time: fast settings that still get
+# most of the gain on HTML.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = frozenset(['text/html'])
+
+
+def negotiate(accept_encoding, encodings=ENCODINGS):
+    """Returns the encoding from encodings the client rates highest, or
+    None if it accepts none of them"""
+    if not accept_encoding:
+        return None
+    accept = parse_accept_header(accept_encoding)
+    best = max(encodings, key=lambda encoding: accept[encoding], default=None)
+    return best if best and accept[best] > 0 else None
+
+
+def compress_static(data, encoding):
+    """Compresses a file's contents as small as the encoding allows, for
+    serving precompressed. The output only depends on the input."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def varies_by_encoding(headers, types=COMPRESSIBLE_TYPES):
+    """Whether a response with these headers may be compressed for some
+    clients, and so needs Vary: Accept-Encoding"""
+    return (
+        headers.get('Content-Type', '').split(';')[0].strip() in types
+        and 'Content-Encoding' not in headers
+        and 'no-transform' not in headers.get('Cache-Control', '')
+    )
+
+
+class _GzipStream:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        return self._z.compress(chunk) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, chunk):
+        return self._c.process(chunk) + self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+STREAMS = {'br': _BrotliStream, 'gzip': _GzipStream}
+
+
+class CompressionMiddleware:
+    """WSGI middleware that compresses HTML responses as they stream out.
+
+    Bodies are read until min_size bytes have arrived; shorter ones go out
+    unchanged. Each chunk the app yields is compressed and flushed on its
+    own, so a streamed page isn't held back. Anything passed to the
+    write() callable from start_response is buffered and goes out ahead
+    of the returned body. Responses that already have a Content-Encoding,
+    like precompressed static files, and anything that isn't HTML are
+    passed through untouched.
+
+    Every HTML response gets Vary: Accept-Encoding, compressed or not,
+    since another client could be sent other bytes for it. A compressed
+    response's ETag is made weak, since its bytes differ from the ones
+    the app hashed; conditional requests still match."""
+
+    def __init__(self, app, min_size=DEFAULT_MIN_SIZE, encodings=ENCODINGS, types=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.encodings = tuple(encodings)
+        self.types = types
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING'), self.encodings)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            encoding = None
+
+        response = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            # Until the real start_response has been called an error
+            # response simply replaces the one captured before.
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'], response['headers'] = status, headers
+            return written.append
+
+        def send(status, headers):
+            response['sent'] = True
+            return start_response(status, headers)
+
+        app_iter = self.app(environ, capture)
+        if ('status' in response and not written
+                and not varies_by_encoding(Headers(response['headers']), self.types)):
+            # Not a page, so the app's own iterable goes back untouched and
+            # a wsgi.file_wrapper for a static file can still be sent with
+            # sendfile.
+            send(response['status'], response['headers'])
+            return app_iter
+        return self._stream(app_iter, chain(written, app_iter), response, encoding, send)
+
+    def _stream(self, app_iter, body, response, encoding, start_response):
+        try:
+            chunks = iter(body)
+            buffered, size = [], 0
+            # At least one chunk is read even when nothing will be
+            # compressed, since an app may call start_response from inside
+            # its body iterator.
+            for chunk in chunks:
+                buffered.append(chunk)
+                size += len(chunk)
+                if not encoding or size >= self.min_size:
+                    break
+
+            status, headers = response['status'], Headers(response['headers'])
+            code = int(status.split(None, 1)[0])
+            if not varies_by_encoding(headers, self.types):
+                start_response(status, headers.to_wsgi_list())
+                yield from chain(buffered, chunks)
+                return
+
+            vary = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+            if 'accept-encoding' not in (value.lower() for value in vary):
+                headers['Vary'] = ', '.join(vary + ['Accept-Encoding'])
+            if not encoding or size < self.min_size or code < 200 or code in (204, 304):
+                start_response(status, headers.to_wsgi_list())
+                yield from chain(buffered, chunks)
+                return
+
+            headers['Content-Encoding'] = encoding
+            headers.remove('Content-Length')
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f'W/{etag}'
+            start_response(status, headers.to_wsgi_list())
+
+            stream = STREAMS[encoding]()
+            for chunk in chain(buffered, chunks):
+                if chunk:
+                    yield stream.compress(chunk)
+            yield stream.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+def init_app(app):
+    """Compresses the app's HTML responses as COMPRESS_MIN_SIZE and
+    COMPRESS_ENCODINGS in its config say, unless no encodings are set"""
+    encodings = app.config['COMPRESS_ENCODINGS']
+    if not encodings:
+        return
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config['COMPRESS_MIN_SIZE'], encodings)
+
+    @app.after_request
+    def vary_compressible(resp):
+        """Marks HTML as varying by Accept-Encoding here too, because
+        Werkzeug drops Content-Type from 304s before the middleware sees
+        them, and a 304 needs the Vary its 200 would have had"""
+        if varies_by_encoding(resp.headers):
+            resp.vary.add('Accept-Encoding')
+        return resp
@@ -0,0 +1,12 @@
+import os
+import threading
+
+
+def write_atomic(path, body):
+    """Writes body to path through a temporary file and a rename, so
+    readers never see a partly written file. Creates missing directories."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(body)
+    os.replace(tmp, path)
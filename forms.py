@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, EmailField, FileField, SubmitField
+from wtforms import StringField, PasswordField, EmailField, FileField, SubmitField, SelectMultipleField
+from wtforms.widgets import CheckboxInput, ListWidget
 from flask_wtf.file import  FileRequired, FileAllowed 
 from wtforms.validators import DataRequired, Length
 
@@ -24,7 +25,7 @@ class LoginForm(FlaskForm):
 
 class PetForm(FlaskForm):
     """Pet form"""
-    nickname = StringField('Nickname', validators=[DataRequired(), Length(max=30)])
+    nickname = StringField('Nickname', validators=[DataRequired(), Length(max=20)])
 
 class ReleasePet(FlaskForm):
     """ Release pet confirmation button"""
@@ -34,6 +35,15 @@ class ForageForm(FlaskForm):
     """Pick a pet to go foraging with"""
     forage = SubmitField('Go foraging!', validators=[DataRequired()])
 
+class ExpeditionForm(FlaskForm):
+    """Pick several pets to go foraging together"""
+    pets = SelectMultipleField(
+        'Pets',
+        coerce=int,
+        widget=ListWidget(prefix_label=False),
+        option_widget=CheckboxInput()
+    )
+
 class DeleteUser(FlaskForm):
     """Delete account confirmation"""
     delete = SubmitField('Delete account', validators=[DataRequired()])
\ No newline at end of file
@@ -1,11 +1,14 @@
 
-import requests
-from models import Pet, Pokemon, Berry, Type
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
 
-import random
+from models import Pokemon, Berry, Type, UserBerry, STAT_MAX
+import catalog
+from pokeapi import DEFAULT_WORKERS, cached_run, fetch_all_pokemon, get_mode, parse_pokemon
 
+import random
+import time
 
-BASE_URL = 'https://pokeapi.co/api/v2/pokemon/'
 
 play_phrases = [
     " jumps around you!",
@@ -16,26 +19,16 @@ play_phrases = [
 ]
 
 berries = [
-    {'name':'aspear', 
-     'img_url': 'https://archives.bulbagarden.net/media/upload/a/af/Dream_Aspear_Berry_Sprite.png'},
-    {'name':'cheri',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/a/a6/Dream_Cheri_Berry_Sprite.png'},
-    {'name':'chesto',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/7/7e/Dream_Chesto_Berry_Sprite.png'},
-    {'name':'leppa',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/e/e2/Dream_Leppa_Berry_Sprite.png'},
-    {'name':'lum',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/d/d3/Dream_Lum_Berry_Sprite.png'},
-    {'name':'oran',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/0/0c/Dream_Oran_Berry_Sprite.png'},
-    {'name':'pecha',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/6/62/Dream_Pecha_Berry_Sprite.png'},
-    {'name':'persim',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/3/38/Dream_Persim_Berry_Sprite.png'},
-    {'name':'rawst',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/5/59/Dream_Rawst_Berry_Sprite.png'},
-    {'name':'sitrus',
-      'img_url': 'https://archives.bulbagarden.net/media/upload/a/aa/Dream_Sitrus_Berry_Sprite.png'},
+    {'name':'aspear', 'img_url': 'images/berries/aspear.png'},
+    {'name':'cheri', 'img_url': 'images/berries/cheri.png'},
+    {'name':'chesto', 'img_url': 'images/berries/chesto.png'},
+    {'name':'leppa', 'img_url': 'images/berries/leppa.png'},
+    {'name':'lum', 'img_url': 'images/berries/lum.png'},
+    {'name':'oran', 'img_url': 'images/berries/oran.png'},
+    {'name':'pecha', 'img_url': 'images/berries/pecha.png'},
+    {'name':'persim', 'img_url': 'images/berries/persim.png'},
+    {'name':'rawst', 'img_url': 'images/berries/rawst.png'},
+    {'name':'sitrus', 'img_url': 'images/berries/sitrus.png'},
                     
 ]
 types = [
@@ -89,67 +82,280 @@ types = [
       'least_fav_berry_id': '7'}
 ]
 
-def create_berry_db(database, berries):
-    """Puts the basic berry types into the database"""
+# Arbitrary key for the advisory lock held while seeding.
+SEED_LOCK_KEY = 0x706f6b65
+
+def upsert_rows(database, model, rows, batch_size=1000):
+    """Inserts rows into model's table with one multi-row INSERT per batch.
+
+    Rows whose primary key already exists are updated in place, so seeding
+    can be re-run safely. Nothing is committed here."""
+    table = model.__table__
+    key = [column.name for column in table.primary_key]
+    for start in range(0, len(rows), batch_size):
+        stmt = insert(table).values(rows[start:start + batch_size])
+        updates = {name: stmt.excluded[name] for name in rows[0] if name not in key}
+        if updates:
+            stmt = stmt.on_conflict_do_update(index_elements=key, set_=updates)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key)
+        database.session.execute(stmt)
+
+    if rows and len(key) == 1 and isinstance(rows[0][key[0]], int):
+        # Explicit ids don't advance serial sequences; move them past the seeded rows.
+        database.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{key[0]}'), "
+            f"(SELECT max({key[0]}) FROM {table.name}))"))
+    return len(rows)
 
-    for berry in berries:
-        new_berry = Berry(
-            name=berry['name'],
-            img_url = berry['img_url']
-        )
-        database.session.add(new_berry)
+def create_berry_db(database, berries, commit=True):
+    """Puts the basic berry types into the database
+
+    Berries get ids in list order, which the types list relies on."""
+    rows = [
+        {'id': i, 'name': berry['name'], 'img_url': berry['img_url']}
+        for i, berry in enumerate(berries, start=1)
+    ]
+    upsert_rows(database, Berry, rows)
+    if commit:
+        catalog.bump_version()
         database.session.commit()
+    return len(rows)
 
-def create_type_db(database, types):
+def create_type_db(database, types, commit=True):
     """ Puts the basic pokemon types into the database"""
-    # types = ['bug', 'dragon','electric','fighting','fire','flying','ghost','grass','ground','ice','normal','poison','psychic','rock','water']
-    for type in types:
-        new_type = Type(
-            name = type['name'],
-            fav_berry_id = type['fav_berry_id'],
-            least_fav_berry_id = type['least_fav_berry_id']
-        )
-        database.session.add(new_type)
+    rows = [
+        {
+            'name': type['name'],
+            'fav_berry_id': int(type['fav_berry_id']),
+            'least_fav_berry_id': int(type['least_fav_berry_id'])
+        }
+        for type in types
+    ]
+    upsert_rows(database, Type, rows)
+    if commit:
+        catalog.bump_version()
         database.session.commit()
+    return len(rows)
+
+# Base experience of a pokemon with rarity weight 1.0 (the starters).
+RARITY_BASE_EXPERIENCE = 64
+
+def rarity_weight(base_experience):
+    """Relative adoption chance; falls as base experience rises, so strong
+    pokemon are offered less often"""
+    if not base_experience:
+        return 1.0
+    return round(RARITY_BASE_EXPERIENCE / base_experience, 4)
 
+def fetch_pokemon_rows(max, workers=DEFAULT_WORKERS):
+    """ Calls pokemon API with a range of specific ID numbers to restrict to Gen 1
 
-def create_pokemon_db(max, database):
-    """ Calls pokemon API with a range of specific ID numbers to restrict to Gen 1"""
+    Responses are fetched concurrently by a bounded worker pool (workers=1
+    fetches serially), or read from the local response cache."""
     gen1ids = range(1, max + 1)
-    for id in gen1ids:
-        resp = requests.get(f'{BASE_URL}/{id}')
-        data = resp.json()
-        
-        pokemon = Pokemon(
-            id = int(data['id']),
-            name = data['name'],
-            sprite_url =data['sprites']['other']['official-artwork']['front_default'],
-            type = data['types'][0]['type']['name']
-            # weight= data['weight']
-        )
-        database.session.add(pokemon)
+    return [
+        dict(parse_pokemon(data), rarity_weight=rarity_weight(data.get('base_experience')))
+        for data in fetch_all_pokemon(gen1ids, workers=workers)
+    ]
+
+def create_pokemon_db(max, database, workers=DEFAULT_WORKERS, commit=True, rows=None):
+    """ Puts pokemon 1..max into the database with one set-based insert"""
+    if rows is None:
+        rows = fetch_pokemon_rows(max, workers)
+    upsert_rows(database, Pokemon, rows)
+    if commit:
+        catalog.bump_version()
+        database.session.commit()
+    return len(rows)
+
+def seed_reference_data(database, max_pokemon=150, workers=DEFAULT_WORKERS):
+    """Loads berries, types and pokemon in a single transaction.
+
+    Pokemon data is fetched before the transaction starts so no network
+    time is spent holding it open. In replay mode only the pokemon in the
+    local cache are loaded. Returns a list of (table, rows, seconds)
+    tuples for each insert."""
+    if get_mode() == 'replay':
+        max_pokemon = min(max_pokemon, cached_run())
+    pokemon_rows = fetch_pokemon_rows(max_pokemon, workers)
+
+    # Serialize concurrent seed runs; the lock is released on commit.
+    database.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': SEED_LOCK_KEY})
+
+    report = []
+    steps = [
+        ('berries', lambda: create_berry_db(database, berries, commit=False)),
+        ('types', lambda: create_type_db(database, types, commit=False)),
+        ('pokemons', lambda: create_pokemon_db(max_pokemon, database, commit=False, rows=pokemon_rows)),
+    ]
+    try:
+        for table, step in steps:
+            start = time.perf_counter()
+            count = step()
+            report.append((table, count, time.perf_counter() - start))
+        catalog.bump_version()
         database.session.commit()
+    except Exception:
+        database.session.rollback()
+        raise
+
+    return report
+
+def reference_data_ready(database):
+    """Checks that berries, types and pokemon have been seeded.
+
+    Uses one round trip of EXISTS probes, so it's cheap enough to run at
+    every worker start."""
+    probes = select(
+        select(Berry.id).exists(),
+        select(Type.name).exists(),
+        select(Pokemon.id).exists()
+    )
+    return all(database.session.execute(probes).one())
+
+def format_seed_report(report):
+    """Formats seed_reference_data's report as one line per table"""
+    lines = []
+    for table, count, seconds in report:
+        rate = count / seconds if seconds else float('inf')
+        lines.append(f"{table:>10}: {count:5d} rows in {seconds * 1000:7.1f}ms ({rate:,.0f} rows/s)")
+    return "\n".join(lines)
+
+# Pokemon offered at the adoption center at a time.
+ADOPTION_OFFER_SIZE = 3
+
+# Longest nickname the pets table accepts.
+NICKNAME_MAX_LENGTH = 20
 
-def get_random_ids(num):
-    """Call num ids from db's range of ids"""
-    ids = random.sample(range(1, 150), num)
-    return ids
+NICKNAME_SUGGESTIONS = 3
+
+# Pokemon per pokedex page.
+POKEDEX_PAGE_SIZE = 60
+
+def nickname_candidates(nickname, pokemon_name=None, count=12):
+    """Builds alternative nicknames to offer when one is taken.
+
+    Candidates are cut to fit the nickname column; they're generated up
+    front so availability can be checked with one indexed query."""
+    base = nickname[:NICKNAME_MAX_LENGTH - 3]
+    candidates = []
+    if pokemon_name:
+        candidates.append(f"{base} the {pokemon_name.capitalize()}")
+        candidates.append(f"{pokemon_name.capitalize()} {base}")
+    candidates += [f"{base}{n}" for n in range(2, 2 + count)]
+    candidates.append(f"{base}{random.randrange(100, 1000)}")
+
+    unique = []
+    for candidate in candidates:
+        candidate = candidate[:NICKNAME_MAX_LENGTH]
+        if candidate.lower() != nickname.lower() and candidate not in unique:
+            unique.append(candidate)
+    return unique
 
 # def populate_shop():
 # time = time.localtime()
 def roll_dice(max):
     return random.randrange(1, max)
 
+# A foraging trip rolls roll_dice(FORAGE_ROLL) and fails below
+# FORAGE_FAIL_BELOW; otherwise roll_dice(BERRY_ROLL) is the berry id found.
+FORAGE_ROLL = 100
+FORAGE_FAIL_BELOW = 10
+BERRY_ROLL = 10
+
 def forage():
     """ Runs a randomizer to see what the forage attempt returns"""
     
-    roll = roll_dice(100)
+    roll = roll_dice(FORAGE_ROLL)
 
-    if roll < 10:
+    if roll < FORAGE_FAIL_BELOW:
         #### 10% chance of straight out failure ###
         return False
     else:
-        berry_roll = roll_dice(10)
-        return Berry.query.get_or_404(berry_roll)
+        berry_roll = roll_dice(BERRY_ROLL)
+        return catalog.get_catalog().berry_or_404(berry_roll)
+
+# Pets at or below this hunger are too tired to forage.
+FORAGE_MIN_HUNGER = 10
+
+# (hunger, happiness) change for each foraging outcome.
+FORAGE_CHANGES = {
+    'tired': (0, -5),
+    'found': (-30, 50),
+    'empty': (-30, -10),
+}
+
+# (hunger, happiness) change for each way of caring for a pet. Pets at
+# STAT_MAX hunger won't eat.
+CARE_CHANGES = {
+    'apple': (10, -5),
+    'fav_berry': (50, 50),
+    'least_fav_berry': (0, -20),
+    'berry': (15, 0),
+    'play': (-10, 10),
+}
+
+# Pets at or below this hunger are too hungry to play.
+PLAY_MIN_HUNGER = 30
+
+# The care actions below are shared by the form routes and the JSON API.
+# Each changes the pet's stats without committing and returns the messages
+# to show as (category, message) pairs, like get_flashed_messages.
+
+def feed_apple(pet):
+    """Feeds pet an apple unless it's full"""
+    if pet.current_hunger == STAT_MAX:
+        return [("DANGER", f"{pet.nickname} isn't hungry right now!")]
+    pet.change_stats(*CARE_CHANGES['apple'])
+    return [("SUCCESS", f"{pet.nickname} crunches on the apple!")]
+
+def feed_berry(pet, user_id, berry, type):
+    """Feeds pet one of the user's berries.
+
+    A least favourite berry is spat out and stays in the inventory; any
+    other is taken from it, unless another request used up the last one."""
+    if pet.current_hunger == STAT_MAX:
+        return [("message", f"{pet.nickname} isn't hungry!")]
+
+    if berry.id == type.least_fav_berry_id:
+        pet.change_stats(*CARE_CHANGES['least_fav_berry'])
+        pet.add_to_berrydex(berry.id)
+        return [("DANGER", f"{pet.nickname} spits out the berry! Yuck!")]
+
+    if UserBerry.take(user_id, berry.id) is None:
+        return [("DANGER", f"You don't have any {berry.name} berries left!")]
+
+    if berry.id == type.fav_berry_id:
+        pet.change_stats(*CARE_CHANGES['fav_berry'])
+        pet.add_to_berrydex(berry.id)
+        return [("SUCCESS", f"{pet.nickname} gobbles up the berry! Delicious!")]
+
+    pet.change_stats(*CARE_CHANGES['berry'])
+    return [("SUCCESS", f"{pet.nickname} eats the berry. Yum!")]
+
+def play_with(pet):
+    """Plays with pet unless it's too hungry"""
+    messages = []
+    if pet.current_happiness == STAT_MAX:
+        messages.append(("SUCCESS", f"{pet.nickname} is as happy as can be!"))
+    if pet.current_hunger <= PLAY_MIN_HUNGER:
+        messages.append(("DANGER", f"{pet.nickname} is too hungry to play!"))
+        return messages
+    pet.change_stats(*CARE_CHANGES['play'])
+    messages.append(("SUCCESS", f"{pet.nickname}{random.choice(play_phrases)}"))
+    return messages
+
+def forage_trip(hunger):
+    """Resolves one foraging trip for a pet with the given hunger.
+
+    Returns (outcome, berry), where outcome is a key of FORAGE_CHANGES
+    and berry is None unless one was found."""
+    if hunger <= FORAGE_MIN_HUNGER:
+        return 'tired', None
+    berry = forage()
+    if berry:
+        return 'found', berry
+    return 'empty', None
     
 
@@ -0,0 +1,4 @@
+-- Case-insensitive unique index on pet nicknames.
+-- New databases get it from db.create_all(); run this on existing ones.
+-- Fails if two pets already share a nickname that differs only by case.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_pets_nickname_lower ON pets (lower(nickname));
@@ -0,0 +1,26 @@
+-- Berry inventory keeps one row per (user, berry) with a quantity instead of
+-- one row per berry. Collapses existing rows into counts and swaps the
+-- surrogate id for the composite primary key.
+BEGIN;
+
+CREATE TABLE user_berries_counts AS
+    SELECT user_id, berry_id, count(*)::integer AS quantity
+    FROM user_berries
+    GROUP BY user_id, berry_id;
+
+DELETE FROM user_berries;
+
+ALTER TABLE user_berries DROP CONSTRAINT user_berries_pkey;
+ALTER TABLE user_berries DROP COLUMN id;
+ALTER TABLE user_berries ALTER COLUMN user_id SET NOT NULL;
+ALTER TABLE user_berries ALTER COLUMN berry_id SET NOT NULL;
+ALTER TABLE user_berries ADD COLUMN quantity integer NOT NULL DEFAULT 1;
+ALTER TABLE user_berries ADD CONSTRAINT user_berries_pkey PRIMARY KEY (user_id, berry_id);
+ALTER TABLE user_berries ADD CONSTRAINT user_berries_quantity_check CHECK (quantity >= 0);
+
+INSERT INTO user_berries (user_id, berry_id, quantity)
+    SELECT user_id, berry_id, quantity FROM user_berries_counts;
+
+DROP TABLE user_berries_counts;
+
+COMMIT;
@@ -0,0 +1,6 @@
+-- Time-based decay of pet hunger and happiness.
+-- Pets remember when their stats were last written; each species has its
+-- own decay rate in points per hour. Existing pets start decaying from now.
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS last_updated timestamptz NOT NULL DEFAULT now();
+ALTER TABLE pokemons ADD COLUMN IF NOT EXISTS hunger_decay double precision NOT NULL DEFAULT 2.0;
+ALTER TABLE pokemons ADD COLUMN IF NOT EXISTS happiness_decay double precision NOT NULL DEFAULT 1.0;
@@ -0,0 +1,4 @@
+-- Random sort key for sampling pets without scanning the table.
+-- Existing pets get a key from random(); new ones get one on insert.
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS random_key double precision NOT NULL DEFAULT random();
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pets_random_key ON pets (random_key);
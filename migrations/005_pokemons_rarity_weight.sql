@@ -0,0 +1,4 @@
+-- Rarity weight used to draw adoption offers.
+-- Existing pokemon default to 1.0 (uniform); re-run `flask --app app seed`
+-- to fill in the weights from each pokemon's base experience.
+ALTER TABLE pokemons ADD COLUMN IF NOT EXISTS rarity_weight double precision NOT NULL DEFAULT 1.0;
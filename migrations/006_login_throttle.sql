@@ -0,0 +1,7 @@
+-- Token buckets for the shared login throttle (LOGIN_THROTTLE_BACKEND=database).
+-- New databases get it from db.create_all().
+CREATE TABLE IF NOT EXISTS login_throttle (
+    key varchar PRIMARY KEY,
+    tokens double precision NOT NULL,
+    updated timestamptz NOT NULL
+);
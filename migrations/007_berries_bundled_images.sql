@@ -0,0 +1,4 @@
+-- Berry images are served from static/images/berries instead of being
+-- hotlinked; img_url now holds a path under static/.
+-- `flask --app app seed` makes the same change.
+UPDATE berries SET img_url = 'images/berries/' || name || '.png' WHERE img_url LIKE 'http%';
@@ -0,0 +1,6 @@
+-- Shared catalog version, bumped by every seed so web workers reload their
+-- in-memory catalog. New databases get it from db.create_all().
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id integer PRIMARY KEY,
+    version bigint NOT NULL
+);
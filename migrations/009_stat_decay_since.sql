@@ -0,0 +1,13 @@
+-- Separate decay starts for hunger and happiness, replacing last_updated.
+-- Writes move each one on by the whole points decayed rather than to now(),
+-- so a pet cared for more often than once a point still decays.
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS hunger_since timestamptz NOT NULL DEFAULT now();
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS happiness_since timestamptz NOT NULL DEFAULT now();
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'pets' AND column_name = 'last_updated') THEN
+        UPDATE pets SET hunger_since = last_updated, happiness_since = last_updated;
+        ALTER TABLE pets DROP COLUMN last_updated;
+    END IF;
+END $$;
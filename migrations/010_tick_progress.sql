@@ -0,0 +1,18 @@
+-- Tick plans and per-worker progress, so every worker of a tick splits the
+-- same pet id range and an interrupted tick resumes instead of reapplying.
+-- New databases get them from db.create_all().
+CREATE TABLE IF NOT EXISTS ticks (
+    id varchar PRIMARY KEY,
+    hunger integer NOT NULL,
+    happiness integer NOT NULL,
+    workers integer NOT NULL,
+    first_pet_id integer,
+    last_pet_id integer,
+    created timestamptz NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS tick_progress (
+    tick_id varchar REFERENCES ticks (id) ON DELETE CASCADE,
+    worker integer,
+    next_pet_id integer NOT NULL,
+    PRIMARY KEY (tick_id, worker)
+);
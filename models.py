@@ -1,9 +1,54 @@
+import math
+import random
+from datetime import datetime, timezone
+
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from sqlalchemy import case, delete, exists, func, literal_column, select, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from passwords import hash_password, check_password, needs_rehash
 
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
+
+# Bounds for pet hunger and happiness.
+STAT_MIN = 0
+STAT_MAX = 100
+
+# Points per hour a pet's hunger and happiness drop by when left alone,
+# unless its species sets its own rate.
+DEFAULT_HUNGER_DECAY = 2.0
+DEFAULT_HAPPINESS_DECAY = 1.0
+
+
+def decayed(value, rate, since, now=None):
+    """Stored stat value less the decay since it was stored"""
+    now = now or datetime.now(timezone.utc)
+    hours = max((now - since).total_seconds(), 0) / 3600
+    return max(value - math.floor(rate * hours), STAT_MIN)
+
+
+def _hours_since_sql(since):
+    return func.greatest(func.extract('epoch', func.now() - since), 0) / 3600
+
+
+def decayed_sql(column, rate, since):
+    """SQL version of decayed(), measured against the database clock"""
+    return func.greatest(column - func.floor(rate * _hours_since_sql(since)), STAT_MIN)
+
+
+def decay_since_sql(rate, since):
+    """New decay start for a stat written now: since moved on by the whole
+    points decayed, so the part of a point still building up isn't lost"""
+    whole_points = func.floor(rate * _hours_since_sql(since))
+    return case(
+        (rate > 0, since + literal_column("interval '1 hour'") * (whole_points / rate)),
+        else_=func.now()
+    )
+
 
 class Pokedex(db.Model):
     """Connection of a user to Seen Pokemon"""
@@ -85,7 +130,7 @@ class User(db.Model):
     @classmethod
     def signup(cls, username, password, email):
         """Signs up new user with an encrypted password"""
-        hashed_pwd = bcrypt.generate_password_hash(password).decode("UTF-8")
+        hashed_pwd = hash_password(password)
 
         user = User(
             username=username,
@@ -104,8 +149,12 @@ class User(db.Model):
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = check_password(user.password, password)
             if is_auth:
+                if needs_rehash(user.password):
+                    # BCRYPT_LOG_ROUNDS changed since this hash was made;
+                    # the caller's commit saves the new one.
+                    user.password = hash_password(password)
                 return user
             
         return False
@@ -150,6 +199,31 @@ class Pet(db.Model):
         default=50
     )
 
+    # When hunger and happiness started decaying from their stored values.
+    # Writes move these on by the whole points decayed, not to now, so a
+    # pet cared for often still decays.
+    hunger_since = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
+    )
+    happiness_since = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
+    )
+
+    # Uniform in [0, 1); indexed so random_sample() can seek into it.
+    random_key = db.Column(
+        db.Float,
+        nullable=False,
+        index=True,
+        default=random.random,
+        server_default=func.random()
+    )
+
     user = db.relationship('User', overlaps="pets")
     pokemon = db.relationship('Pokemon')
 
@@ -163,52 +237,152 @@ class Pet(db.Model):
     def __repr__(self):
         return f"<Pet #{self.id} {self.nickname}, Owner {self.user.username}>"
 
+    def add_to_berrydex(self, berry_id):
+        """Records that the pet has tried a berry, if it hasn't already"""
+        db.session.execute(
+            insert(Berrydex)
+            .values(pet_id=self.id, berry_tried_id=berry_id)
+            .on_conflict_do_nothing()
+        )
+
+
+    @classmethod
+    def random_sample(cls, count, options=()):
+        """Returns up to count pets chosen at random.
+
+        Picks a random point on random_key and reads the next count pets
+        from its index, wrapping around to the start if it runs off the
+        end, so the cost doesn't grow with the table."""
+        start = random.random()
+        query = cls.query.options(*options).order_by(cls.random_key)
+        pets = query.filter(cls.random_key >= start).limit(count).all()
+        if len(pets) < count:
+            pets += query.filter(cls.random_key < start).limit(count - len(pets)).all()
+        return pets
+
+    @classmethod
+    def nickname_taken(cls, nickname):
+        """Checks whether any pet already has nickname, ignoring case"""
+        return db.session.query(
+            exists().where(func.lower(cls.nickname) == nickname.lower())
+        ).scalar()
+
+    @classmethod
+    def taken_nicknames(cls, nicknames):
+        """Returns the lowercased nicknames from the list that are in use"""
+        lowered = {nickname.lower() for nickname in nicknames}
+        rows = db.session.query(func.lower(cls.nickname)).filter(func.lower(cls.nickname).in_(lowered))
+        return {nickname for (nickname,) in rows}
+
+    def _decay_rates(self):
+        # Read from the catalog so checking a pet's stats never loads its Pokemon row.
+        from catalog import get_catalog
+        poke = get_catalog().pokemon.get(self.poke_id)
+        if poke is None:
+            return DEFAULT_HUNGER_DECAY, DEFAULT_HAPPINESS_DECAY
+        return poke.hunger_decay, poke.happiness_decay
+
+    def _decayed_stat(self, name, rate):
+        since = getattr(self, f'{name}_since')
+        if since is None:
+            return getattr(self, name)
+        return decayed(getattr(self, name), rate, since)
+
+    @hybrid_property
+    def current_hunger(self):
+        """Hunger as of now, after decay"""
+        return self._decayed_stat('hunger', self._decay_rates()[0])
+
+    @current_hunger.inplace.expression
+    @classmethod
+    def _current_hunger_expression(cls):
+        rate = select(Pokemon.hunger_decay).where(Pokemon.id == cls.poke_id).scalar_subquery()
+        return decayed_sql(cls.hunger, rate, cls.hunger_since)
+
+    @hybrid_property
+    def current_happiness(self):
+        """Happiness as of now, after decay"""
+        return self._decayed_stat('happiness', self._decay_rates()[1])
+
+    @current_happiness.inplace.expression
+    @classmethod
+    def _current_happiness_expression(cls):
+        rate = select(Pokemon.happiness_decay).where(Pokemon.id == cls.poke_id).scalar_subquery()
+        return decayed_sql(cls.happiness, rate, cls.happiness_since)
+
+    @classmethod
+    def stat_update_values(cls, hunger=0, happiness=0):
+        """SET clause that adds deltas to the decayed stats, clamped to
+        STAT_MIN-STAT_MAX, and moves each stat's decay start on by the
+        points it lost.
+
+        Both stats are brought up to date even if only one of them
+        changes, so decay is never counted twice. The UPDATE has to join
+        pokemons on Pet.poke_id for the decay rates."""
+        rates = {'hunger': Pokemon.hunger_decay, 'happiness': Pokemon.happiness_decay}
+        deltas = {'hunger': hunger, 'happiness': happiness}
+        values = {}
+        for name, delta in deltas.items():
+            since = getattr(cls, f'{name}_since')
+            values[name] = func.least(func.greatest(
+                decayed_sql(getattr(cls, name), rates[name], since) + delta,
+                STAT_MIN), STAT_MAX)
+            values[f'{name}_since'] = decay_since_sql(rates[name], since)
+        return values
+
+    def change_stats(self, hunger=0, happiness=0):
+        """Adds the given deltas to the pet's decayed stats in a single UPDATE.
+
+        The database does the clamping, so concurrent changes don't
+        overwrite each other. The pet's attributes are set to the stored
+        values and the pet is returned."""
+        row = db.session.execute(
+            update(Pet)
+            .where(Pet.id == self.id, Pokemon.id == Pet.poke_id)
+            .values(Pet.stat_update_values(hunger, happiness))
+            .returning(Pet.hunger, Pet.happiness, Pet.hunger_since, Pet.happiness_since),
+            execution_options={'synchronize_session': False}
+        ).one()
+
+        for name in ('hunger', 'happiness', 'hunger_since', 'happiness_since'):
+            set_committed_value(self, name, getattr(row, name))
+        return self
+
+    @classmethod
+    def change_stats_many(cls, ids, hunger=0, happiness=0):
+        """Adds the same deltas to several pets in one UPDATE, like
+        change_stats. Returns the number of pets changed."""
+        if not ids:
+            return 0
+        return db.session.execute(
+            update(Pet)
+            .where(Pet.id.in_(ids), Pokemon.id == Pet.poke_id)
+            .values(Pet.stat_update_values(hunger, happiness)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
 
     def decrease_happiness(self, amt):
         """Decreases pet happiness by inputted amount"""
-        pet = Pet.query.filter_by(id=self.id).first()
-
-        if (pet.happiness - amt) < 0:
-            pet.happiness = 0
-            return pet
-        else:
-            pet.happiness -= amt
-            return pet
+        return self.change_stats(happiness=-amt)
 
     def increase_happiness(self, amt):
         """Increases pet happiness by inputted amount"""
-        pet = Pet.query.filter_by(id=self.id).first()
-
-        if (pet.happiness + amt) > 100:
-            pet.happiness = 100
-            return pet
-        else:
-            pet.happiness += amt
-            return pet
+        return self.change_stats(happiness=amt)
    
     def decrease_hunger(self, amt):
         """Decreases pet hunger by inputted amount"""
-        pet = Pet.query.filter_by(id=self.id).first()
-
-        if (pet.hunger - amt) < 0:
-            pet.hunger = 0
-            return pet
-        else:
-            pet.hunger -= amt
-            return pet
+        return self.change_stats(hunger=-amt)
 
     def increase_hunger(self, amt):
         """Increases pet hunger by inputted amount"""
-        pet = Pet.query.filter_by(id=self.id).first()
-
-        if (pet.hunger + amt) > 100:
-            pet.hunger = 100
-            return pet
-        else:
-            pet.hunger += amt
-            return pet
+        return self.change_stats(hunger=amt)
     
 
+# Nicknames are unique regardless of case; availability checks and
+# suggestions query lower(nickname) so they're answered from this index.
+db.Index('ix_pets_nickname_lower', func.lower(Pet.nickname), unique=True)
+
+
 class Pokemon(db.Model):
     """Pokemon details"""
     __tablename__= "pokemons"
@@ -230,6 +404,26 @@ class Pokemon(db.Model):
         db.ForeignKey('types.name', ondelete="CASCADE"),
         nullable=False
     )
+    # Stat points lost per hour by pets of this species.
+    hunger_decay = db.Column(
+        db.Float,
+        nullable=False,
+        default=DEFAULT_HUNGER_DECAY,
+        server_default=str(DEFAULT_HUNGER_DECAY)
+    )
+    happiness_decay = db.Column(
+        db.Float,
+        nullable=False,
+        default=DEFAULT_HAPPINESS_DECAY,
+        server_default=str(DEFAULT_HAPPINESS_DECAY)
+    )
+    # Relative chance of being offered for adoption; rarer pokemon are lower.
+    rarity_weight = db.Column(
+        db.Float,
+        nullable=False,
+        default=1.0,
+        server_default='1.0'
+    )
     def pokedex_id(self):
         return (f"{self.id:03d}")
 
@@ -273,28 +467,189 @@ class Berry(db.Model):
     )
 
 class UserBerry(db.Model):
-    """Berries owned by user"""
+    """Berries owned by user, one row per berry kind with a count"""
     __tablename__ = "user_berries"
-
-    id= db.Column(
-        db.Integer,
-        primary_key=True,
-        autoincrement=True
+    __table_args__ = (
+        db.CheckConstraint('quantity >= 0', name='user_berries_quantity_check'),
     )
+
     user_id = db.Column(
         db.Integer,
         db.ForeignKey('users.id', ondelete="CASCADE"),
-        nullable=False
+        primary_key=True
     )
     berry_id = db.Column(
         db.Integer,
         db.ForeignKey('berries.id'),
-        nullable=False
+        primary_key=True
+    )
+    quantity = db.Column(
+        db.Integer,
+        nullable=False,
+        default=1
     )
     
     user = db.relationship('User')
     berry = db.relationship('Berry')
 
+    @classmethod
+    def add_many(cls, user_id, counts):
+        """Adds {berry_id: amount} to a user's inventory in one upsert"""
+        rows = [
+            {'user_id': user_id, 'berry_id': berry_id, 'quantity': amount}
+            for berry_id, amount in counts.items() if amount > 0
+        ]
+        if not rows:
+            return
+        stmt = insert(cls).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.berry_id],
+            set_={'quantity': cls.quantity + stmt.excluded.quantity}
+        ))
+
+    @classmethod
+    def add(cls, user_id, berry_id, amount=1):
+        """Adds berries to a user's inventory"""
+        cls.add_many(user_id, {berry_id: amount})
+
+    @classmethod
+    def take(cls, user_id, berry_id, amount=1):
+        """Removes berries from a user's inventory.
+
+        Returns the quantity left, or None if the user didn't have enough.
+        The row is deleted when the last berry is taken."""
+        remaining = db.session.execute(
+            update(cls)
+            .where(cls.user_id == user_id, cls.berry_id == berry_id, cls.quantity >= amount)
+            .values(quantity=cls.quantity - amount)
+            .returning(cls.quantity),
+            execution_options={'synchronize_session': False}
+        ).scalar()
+        if remaining == 0:
+            db.session.execute(
+                delete(cls)
+                .where(cls.user_id == user_id, cls.berry_id == berry_id, cls.quantity == 0),
+                execution_options={'synchronize_session': False}
+            )
+        return remaining
+
+
+class ThrottleBucket(db.Model):
+    """Login attempt token bucket, for throttle.DatabaseBackend"""
+    __tablename__ = "login_throttle"
+
+    key = db.Column(
+        db.String,
+        primary_key=True
+    )
+    tokens = db.Column(
+        db.Float,
+        nullable=False
+    )
+    updated = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False
+    )
+
+
+class Tick(db.Model):
+    """One run of the tick engine, planned once and shared by its workers"""
+    __tablename__ = "ticks"
+
+    id = db.Column(
+        db.String,
+        primary_key=True
+    )
+    hunger = db.Column(
+        db.Integer,
+        nullable=False
+    )
+    happiness = db.Column(
+        db.Integer,
+        nullable=False
+    )
+    workers = db.Column(
+        db.Integer,
+        nullable=False
+    )
+    # Pet ids the tick covers, fixed when it's planned; null if there
+    # were no pets.
+    first_pet_id = db.Column(
+        db.Integer
+    )
+    last_pet_id = db.Column(
+        db.Integer
+    )
+    created = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
+    )
+
+
+class TickProgress(db.Model):
+    """How far one worker of a tick has got"""
+    __tablename__ = "tick_progress"
+
+    tick_id = db.Column(
+        db.String,
+        db.ForeignKey('ticks.id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    worker = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    # Pets below this id in the worker's partition are done.
+    next_pet_id = db.Column(
+        db.Integer,
+        nullable=False
+    )
+
+
+class CatalogVersion(db.Model):
+    """Single row counting reference data changes, so every worker can
+    tell when its catalog snapshot is stale"""
+    __tablename__ = "catalog_version"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True
+    )
+    version = db.Column(
+        db.BigInteger,
+        nullable=False
+    )
+
+
+# Eager-loading bundles for each page, named after what its template walks.
+# Routes pass one to .options() so a page renders in a fixed number of
+# queries no matter how many pets or berries are on it.
+LOADER_PROFILES = {
+    # users/profile.html: user.pets -> pet.pokemon, user.berries -> berry.berry
+    'user_profile': (
+        selectinload(User.pets).joinedload(Pet.pokemon),
+        selectinload(User.berries).joinedload(UserBerry.berry),
+    ),
+    # forage.html: user.pets -> pet.pokemon
+    'user_forage': (
+        selectinload(User.pets).joinedload(Pet.pokemon),
+    ),
+    # pets/details.html: pet.user, pet.berrydex
+    'pet_detail': (
+        joinedload(Pet.user),
+        selectinload(Pet.berrydex),
+    ),
+    # pets/details.html inventory: item.berry
+    'inventory': (
+        joinedload(UserBerry.berry),
+    ),
+    # pets/random.html: pet.user, pet.pokemon
+    'pet_showcase': (
+        joinedload(Pet.user),
+        joinedload(Pet.pokemon),
+    ),
+}
 
     
 def connect_db(app):
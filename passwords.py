@@ -0,0 +1,97 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app
+
+# bcrypt cost factor (log2 of the rounds) when BCRYPT_LOG_ROUNDS isn't set.
+DEFAULT_LOG_ROUNDS = 12
+
+# Hashes run at once per process. Leaving cores free keeps a burst of
+# logins from starving every other route.
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Hashes that may wait for a worker, and how long a new one waits for a
+# place in line before it's turned away.
+DEFAULT_MAX_PENDING = 32
+QUEUE_TIMEOUT = 10
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many password hashes are already waiting"""
+
+
+class BoundedExecutor:
+    """Thread pool that holds at most workers + max_pending tasks.
+
+    bcrypt releases the GIL, so hashes run in parallel with request
+    threads; the bound stops a login storm from queueing unbounded work."""
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def run(self, fn, *args, timeout=QUEUE_TIMEOUT):
+        """Runs fn(*args) on the pool and waits for the result"""
+        if not self._slots.acquire(timeout=timeout):
+            raise PasswordHasherBusy("Too many password hashes queued")
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns this process's hashing pool, sized from the app config"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                config = current_app.config
+                _executor = BoundedExecutor(
+                    config.get('BCRYPT_WORKERS', DEFAULT_WORKERS),
+                    config.get('BCRYPT_MAX_PENDING', DEFAULT_MAX_PENDING))
+    return _executor
+
+
+def reset_executor():
+    """Shuts the pool down so the next hash builds one from the current config"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+
+
+def hash_password(password):
+    """Hashes password with the configured cost factor"""
+    salt = bcrypt.gensalt(log_rounds())
+    return get_executor().run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def check_password(hashed, password):
+    """Checks password against a stored hash"""
+    return get_executor().run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def needs_rehash(hashed):
+    """True if hashed was made with a different cost factor than the
+    configured one"""
+    # Hashes look like $2b$<cost>$<salt and digest>.
+    return int(hashed.split('$')[2]) != log_rounds()
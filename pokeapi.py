@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from files import write_atomic
+
+
+BASE_URL = 'https://pokeapi.co/api/v2/pokemon/'
+
+# Connection pool size and worker count used for concurrent ingestion.
+DEFAULT_WORKERS = 8
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Bump when the on-disk layout or the fields kept by compact() change;
+# caches written with another version are ignored.
+CACHE_VERSION = 1
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pokeapi_cache')
+
+# 'cache' reads through the local cache and stores misses, 'replay' never
+# touches the network, 'live' always fetches and skips the cache.
+MODES = ('cache', 'replay', 'live')
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a response isn't in the local cache"""
+
+
+def get_mode():
+    """Returns the loader mode from POKEAPI_MODE, defaulting to 'cache'"""
+    mode = os.environ.get('POKEAPI_MODE', 'cache')
+    if mode not in MODES:
+        raise ValueError(f"POKEAPI_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+def compact(data):
+    """Strips a raw pokemon response down to the fields we read, keeping the
+    API's shape so the same parsing works on cached and live data"""
+    return {
+        'id': data['id'],
+        'name': data['name'],
+        'base_experience': data.get('base_experience'),
+        'sprites': {'other': {'official-artwork': {
+            'front_default': data['sprites']['other']['official-artwork']['front_default']}}},
+        'types': [{'slot': t['slot'], 'type': {'name': t['type']['name']}} for t in data['types']]
+    }
+
+
+class ResponseCache:
+    """Content-addressed store of compacted API responses.
+
+    index.json maps request keys like 'pokemon/25' to the sha256 of the
+    response body, which lives in objects/<2 chars>/<rest>.json."""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('POKEAPI_CACHE_DIR', CACHE_DIR)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, 'index.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], f'{digest[2:]}.json')
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                index = {}
+            if index.get('version') == CACHE_VERSION:
+                self._entries = index['entries']
+            else:
+                self._entries = {}
+        return self._entries
+
+    def get(self, key):
+        """Returns the cached response for key, or None"""
+        digest = self.entries.get(key)
+        if digest is None:
+            return None
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        """Stores a compacted response under key and returns it"""
+        data = compact(data)
+        body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+        digest = hashlib.sha256(body).hexdigest()
+
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            write_atomic(path, body)
+
+        with self._lock:
+            self.entries[key] = digest
+            index = {'version': CACHE_VERSION, 'entries': dict(sorted(self.entries.items(), key=_key_order))}
+            write_atomic(self.index_path, json.dumps(index, indent=1).encode())
+        return data
+
+
+def cached_run(cache=None, kind='pokemon'):
+    """Number of ids 1, 2, ... in a row that are cached for kind, which is
+    as far as replay mode can load without missing one"""
+    cache = cache or ResponseCache()
+    count = 0
+    while f'{kind}/{count + 1}' in cache.entries:
+        count += 1
+    return count
+
+
+def _key_order(item):
+    kind, _, id = item[0].partition('/')
+    return (kind, int(id) if id.isdigit() else 0, id)
+
+
+def make_session(workers=DEFAULT_WORKERS, retries=5, backoff=0.5):
+    """Builds a keep-alive session shared by every fetch, with a pool sized
+    for the worker count and exponential backoff on transient failures."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET'])
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_pokemon(id, session=None, base_url=BASE_URL):
+    """Fetches the raw API data for one pokemon"""
+    get = session.get if session else requests.get
+    resp = get(f'{base_url}{id}', timeout=10)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def fetch_all_pokemon(ids, workers=DEFAULT_WORKERS, base_url=BASE_URL, mode=None, cache=None):
+    """Fetches the API data for every id, in order.
+
+    Depending on the mode, responses come from the local cache first and
+    only misses go to the network. Network requests run on a bounded thread
+    pool over one pooled session; workers=1 fetches serially."""
+    ids = list(ids)
+    mode = mode or get_mode()
+    cache = cache or ResponseCache()
+
+    results = {}
+    if mode != 'live':
+        for id in ids:
+            data = cache.get(f'pokemon/{id}')
+            if data is not None:
+                results[id] = data
+
+    missing = [id for id in ids if id not in results]
+    if missing and mode == 'replay':
+        raise CacheMissError(
+            f"{len(missing)} pokemon missing from {cache.path} (first: {missing[0]}); "
+            "run `python -m pokeapi refresh` or unset POKEAPI_MODE=replay")
+
+    if missing:
+        def fetch(id):
+            data = fetch_pokemon(id, session, base_url)
+            return cache.put(f'pokemon/{id}', data) if mode != 'live' else data
+
+        with make_session(workers) as session:
+            if workers <= 1:
+                fetched = [fetch(id) for id in missing]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    fetched = list(pool.map(fetch, missing))
+        results.update(zip(missing, fetched))
+
+    return [results[id] for id in ids]
+
+
+def parse_pokemon(data):
+    """Pulls the columns we store out of the raw API data"""
+    return {
+        'id': int(data['id']),
+        'name': data['name'],
+        'sprite_url': data['sprites']['other']['official-artwork']['front_default'],
+        'type': data['types'][0]['type']['name']
+    }
+
+
+def refresh_cache(max_id, workers=DEFAULT_WORKERS, base_url=BASE_URL, path=None):
+    """Re-downloads pokemon 1..max_id into the cache, replacing old entries"""
+    cache = ResponseCache(path)
+    ids = range(1, max_id + 1)
+    with make_session(workers) as session:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            list(pool.map(lambda id: cache.put(f'pokemon/{id}', fetch_pokemon(id, session, base_url)), ids))
+    return cache
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the local PokeAPI response cache")
+    commands = parser.add_subparsers(dest='command', required=True)
+    refresh = commands.add_parser('refresh', help="re-download pokemon into the cache")
+    refresh.add_argument('--max', type=int, default=150, help="highest pokemon id to fetch")
+    refresh.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    refresh.add_argument('--path', help="cache directory (default: POKEAPI_CACHE_DIR or ./pokeapi_cache)")
+    args = parser.parse_args()
+
+    cache = refresh_cache(args.max, workers=args.workers, path=args.path)
+    print(f"Cached {args.max} pokemon in {cache.path}")
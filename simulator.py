@@ -0,0 +1,157 @@
+"""Monte Carlo simulation of the forage and care economy.
+
+Runs many simulated pets through random forage/feed/play actions at once
+with NumPy, using the dice, stat changes and clamping the app itself uses
+(imported from functions.py and models.py), and reports how fast berries
+come in and where hunger and happiness end up.
+
+    python -m simulator --pets 1000000 --steps 20
+"""
+import argparse
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from functions import (
+    berries, types, FORAGE_ROLL, FORAGE_FAIL_BELOW, BERRY_ROLL, FORAGE_CHANGES,
+    FORAGE_MIN_HUNGER, CARE_CHANGES, PLAY_MIN_HUNGER
+)
+from models import STAT_MIN, STAT_MAX
+
+ACTIONS = ('forage', 'feed', 'play')
+
+# Share of pets taking each action per step.
+DEFAULT_MIX = {'forage': 0.4, 'feed': 0.35, 'play': 0.25}
+
+# Starting hunger and happiness, matching the Pet column defaults.
+START_STAT = 50
+
+SimulationResult = namedtuple('SimulationResult', 'pets steps hunger happiness inventory found events')
+
+
+def roll_dice(rng, max, size):
+    """Vectorized functions.roll_dice: uniform over 1..max-1"""
+    return rng.integers(1, max, size=size)
+
+
+def simulate(pets=100000, steps=20, mix=DEFAULT_MIX, seed=None):
+    """Runs every pet through steps rounds of one random action each.
+
+    Each round every pet forages, eats or plays, chosen by mix. Feeding
+    uses a berry from the pet's own inventory, picked in proportion to
+    how many of each it holds, or an apple if it has none. Returns a
+    SimulationResult with the final stats, inventories, berries found per
+    berry id and a Counter of what happened."""
+    rng = np.random.default_rng(seed)
+    weights = np.array([mix.get(action, 0) for action in ACTIONS], dtype=float)
+
+    fav = np.array([int(type['fav_berry_id']) for type in types])
+    least_fav = np.array([int(type['least_fav_berry_id']) for type in types])
+    species = rng.integers(0, len(types), size=pets)
+    pet_fav, pet_least_fav = fav[species], least_fav[species]
+
+    hunger = np.full(pets, START_STAT, dtype=np.int16)
+    happiness = np.full(pets, START_STAT, dtype=np.int16)
+    # Column i holds berry id i; column 0 is unused.
+    inventory = np.zeros((pets, len(berries) + 1), dtype=np.int32)
+    found = np.zeros(len(berries) + 1, dtype=np.int64)
+    events = Counter()
+
+    def change(idx, deltas, name):
+        # Same clamping as Pet.change_stats.
+        hunger[idx] = np.clip(hunger[idx] + deltas[0], STAT_MIN, STAT_MAX)
+        happiness[idx] = np.clip(happiness[idx] + deltas[1], STAT_MIN, STAT_MAX)
+        events[name] += idx.size
+
+    for _ in range(steps):
+        action = rng.choice(len(ACTIONS), size=pets, p=weights / weights.sum())
+
+        # Foraging, as in functions.forage_trip.
+        idx = np.flatnonzero(action == 0)
+        tired = hunger[idx] <= FORAGE_MIN_HUNGER
+        change(idx[tired], FORAGE_CHANGES['tired'], 'forage_tired')
+        idx = idx[~tired]
+        failed = roll_dice(rng, FORAGE_ROLL, idx.size) < FORAGE_FAIL_BELOW
+        change(idx[failed], FORAGE_CHANGES['empty'], 'forage_empty')
+        idx = idx[~failed]
+        berry = roll_dice(rng, BERRY_ROLL, idx.size)
+        inventory[idx, berry] += 1
+        found += np.bincount(berry, minlength=found.size)
+        change(idx, FORAGE_CHANGES['found'], 'forage_found')
+
+        # Feeding, as in the feed_pet and feed_pet_berry routes.
+        idx = np.flatnonzero(action == 1)
+        full = hunger[idx] == STAT_MAX
+        events['feed_refused'] += int(full.sum())
+        idx = idx[~full]
+        has_berries = inventory[idx].sum(axis=1) > 0
+        change(idx[~has_berries], CARE_CHANGES['apple'], 'feed_apple')
+        idx = idx[has_berries]
+        counts = inventory[idx].cumsum(axis=1)
+        pick = rng.random(idx.size) * counts[:, -1]
+        berry = (counts <= pick[:, None]).sum(axis=1)
+
+        spat = berry == pet_least_fav[idx]
+        change(idx[spat], CARE_CHANGES['least_fav_berry'], 'feed_least_fav_berry')
+        loved = berry == pet_fav[idx]
+        change(idx[loved], CARE_CHANGES['fav_berry'], 'feed_fav_berry')
+        plain = ~spat & ~loved
+        change(idx[plain], CARE_CHANGES['berry'], 'feed_berry')
+        # Least favourite berries are spat out, not eaten.
+        inventory[idx[~spat], berry[~spat]] -= 1
+
+        # Playing, as in the play_with_pet route.
+        idx = np.flatnonzero(action == 2)
+        too_hungry = hunger[idx] <= PLAY_MIN_HUNGER
+        events['play_refused'] += int(too_hungry.sum())
+        change(idx[~too_hungry], CARE_CHANGES['play'], 'play')
+
+    return SimulationResult(pets, steps, hunger, happiness, inventory, found, events)
+
+
+def describe(values):
+    """Mean, percentiles and share at each bound of a stat"""
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return (f"mean {values.mean():5.1f}  p10 {p10:3.0f}  p50 {p50:3.0f}  p90 {p90:3.0f}  "
+            f"at {STAT_MIN}: {np.mean(values == STAT_MIN):6.1%}  at {STAT_MAX}: {np.mean(values == STAT_MAX):6.1%}")
+
+
+def format_report(result):
+    """Formats a SimulationResult for the terminal"""
+    events = result.events
+    sessions = result.pets * result.steps
+    trips = events['forage_tired'] + events['forage_empty'] + events['forage_found']
+    total_found = int(result.found.sum())
+
+    lines = [f"{result.pets:,} pets x {result.steps} steps = {sessions:,} actions", "", "Events:"]
+    lines += [f"  {name:<22} {count:>12,} ({count / sessions:6.1%})" for name, count in sorted(events.items())]
+    lines += [
+        "",
+        "Berry inflow:",
+        f"  {total_found / max(trips, 1):.3f} per forage trip, {total_found / sessions:.3f} per action, "
+        f"{total_found / result.pets:.2f} per pet",
+        f"  {int(result.inventory.sum()) / result.pets:.2f} held per pet at the end",
+    ]
+    for id, berry in enumerate(berries, start=1):
+        share = result.found[id] / max(total_found, 1)
+        lines.append(f"  {berry['name']:<10} {int(result.found[id]):>12,} ({share:6.1%})")
+    lines += [
+        "",
+        "Final stats:",
+        f"  hunger     {describe(result.hunger)}",
+        f"  happiness  {describe(result.happiness)}",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', type=int, default=1000000)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--seed', type=int)
+    for action in ACTIONS:
+        parser.add_argument(f'--{action}', type=float, default=DEFAULT_MIX[action],
+                            help=f"share of pets that {action} each step")
+    args = parser.parse_args()
+    mix = {action: getattr(args, action) for action in ACTIONS}
+    print(format_report(simulate(args.pets, args.steps, mix, args.seed)))
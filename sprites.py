@@ -0,0 +1,227 @@
+"""Local copies of the pokemon artwork, as small fingerprinted thumbnails.
+
+Each pokemon's official artwork is downloaded once into SPRITE_SOURCE_DIR
+(or dropped there by hand as <id>.png, e.g. from a fixture set), then
+resized to every SPRITE_SIZES in WebP and PNG and written through the
+asset manifest. Templates use sprite_url(); pokemon without a local copy
+keep their remote sprite_url.
+
+The large thumbnails are also packed into atlas sheets of ATLAS_SHEET_SIZE
+pokemon each, by id, with a stylesheet giving each pokemon's position, so
+a grid of sprites costs one image request per sheet. A sheet is only
+redrawn when one of its thumbnails changes.
+
+    flask sprites
+"""
+import hashlib
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+
+import assets
+from files import write_atomic
+from functions import POKEDEX_PAGE_SIZE
+from pokeapi import DEFAULT_WORKERS, get_mode, make_session
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sprite_cache')
+
+# Thumbnail widths in pixels. Pages show sprites at up to 250px, so the
+# larger size covers that and the smaller one suits lists and grids.
+SPRITE_SIZES = (96, 256)
+SPRITE_FORMATS = ('webp', 'png')
+
+# Lossy WebP quality; the artwork is flat-shaded, so this is visually
+# lossless at these sizes. Method 6 only saves ~5% more than 4 and takes
+# ten times as long on an atlas sheet.
+WEBP_QUALITY = 85
+WEBP_METHOD = 4
+
+# Pokemon per atlas sheet and cells per row. Sheets cover fixed id
+# ranges, so adding pokemon only touches the last sheet or adds new ones,
+# and each unfiltered pokedex page is exactly one sheet.
+ATLAS_SHEET_SIZE = POKEDEX_PAGE_SIZE
+ATLAS_COLUMNS = 10
+ATLAS_CELL = SPRITE_SIZES[-1]
+ATLAS_STYLESHEET = 'atlas/sprites.css'
+
+SpriteReport = namedtuple('SpriteReport', 'pokemon downloaded built unchanged missing bytes sheets')
+
+
+def source_dir():
+    return os.environ.get('SPRITE_SOURCE_DIR', SOURCE_DIR)
+
+
+def original_path(id, directory=None):
+    return os.path.join(directory or source_dir(), f'{id}.png')
+
+
+def sprite_name(id, size, format):
+    """Logical asset name of one thumbnail"""
+    return f'sprites/{id}-{size}.{format}'
+
+
+def fetch_originals(pokemon, directory=None, workers=DEFAULT_WORKERS, mode=None):
+    """Downloads artwork that isn't in the source directory yet.
+
+    Returns the number downloaded. Artwork that can't be fetched is
+    skipped and left to the remote URL, like everything in replay mode,
+    where nothing is fetched."""
+    directory = directory or source_dir()
+    missing = [poke for poke in pokemon
+               if poke.sprite_url and not os.path.exists(original_path(poke.id, directory))]
+    if not missing or (mode or get_mode()) == 'replay':
+        return 0
+
+    def fetch(poke):
+        try:
+            resp = session.get(poke.sprite_url, timeout=10)
+            resp.raise_for_status()
+        except requests.RequestException:
+            return False
+        write_atomic(original_path(poke.id, directory), resp.content)
+        return True
+
+    with make_session(workers) as session:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            return sum(pool.map(fetch, missing))
+
+
+def make_thumbnails(original, sizes=SPRITE_SIZES, formats=SPRITE_FORMATS):
+    """Resizes image bytes to each size and format.
+
+    Returns {(size, format): bytes}. Images are fitted into a square of
+    the given size, keeping their aspect ratio."""
+    image = Image.open(io.BytesIO(original)).convert('RGBA')
+    thumbnails = {}
+    for size in sizes:
+        thumb = image.copy()
+        thumb.thumbnail((size, size), Image.LANCZOS)
+        for format in formats:
+            out = io.BytesIO()
+            if format == 'webp':
+                thumb.save(out, 'WEBP', quality=WEBP_QUALITY, method=WEBP_METHOD)
+            else:
+                thumb.save(out, 'PNG', optimize=True)
+            thumbnails[size, format] = out.getvalue()
+    return thumbnails
+
+
+def build_sprites(pokemon, manifest=None, directory=None, workers=DEFAULT_WORKERS, mode=None):
+    """Fetches missing artwork and builds thumbnails for every pokemon.
+
+    Artwork whose contents haven't changed since the last build is
+    skipped. Returns a SpriteReport."""
+    manifest = manifest or assets.manifest
+    directory = directory or source_dir()
+    pokemon = list(pokemon)
+    downloaded = fetch_originals(pokemon, directory, workers, mode)
+
+    built = unchanged = missing = size = 0
+    for poke in pokemon:
+        try:
+            with open(original_path(poke.id, directory), 'rb') as f:
+                original = f.read()
+        except FileNotFoundError:
+            missing += 1
+            continue
+
+        source = f'sprites/{poke.id}'
+        digest = hashlib.sha256(original).hexdigest()
+        names = [sprite_name(poke.id, s, f) for s in SPRITE_SIZES for f in SPRITE_FORMATS]
+        if manifest.source_digest(source) == digest and all(manifest.get(name) for name in names):
+            unchanged += 1
+            continue
+
+        for (s, f), data in make_thumbnails(original).items():
+            manifest.add(sprite_name(poke.id, s, f), data, source, digest)
+            size += len(data)
+        built += 1
+
+    sheets = build_atlas(pokemon, manifest)
+    manifest.save()
+    return SpriteReport(len(pokemon), downloaded, built, unchanged, missing, size, sheets)
+
+
+def atlas_cell(id):
+    """(sheet, column, row) of a pokemon in the atlas"""
+    sheet, cell = divmod(id - 1, ATLAS_SHEET_SIZE)
+    row, column = divmod(cell, ATLAS_COLUMNS)
+    return sheet, column, row
+
+
+def build_atlas(pokemon, manifest):
+    """Packs the thumbnails into sheets and writes the stylesheet.
+
+    Each sheet's inputs are recorded by their fingerprinted names and
+    the sheet geometry, so sheets whose thumbnails haven't changed are
+    kept. Returns the number
+    of sheets drawn."""
+    rows = -(-ATLAS_SHEET_SIZE // ATLAS_COLUMNS)
+    members = {}
+    for poke in sorted(pokemon, key=lambda poke: poke.id):
+        thumbnail = manifest.get(sprite_name(poke.id, ATLAS_CELL, 'png'))
+        if thumbnail:
+            members.setdefault(atlas_cell(poke.id)[0], []).append((poke.id, thumbnail))
+
+    drawn = 0
+    rules = [
+        ".sprite {\n"
+        "    display: inline-block;\n"
+        f"    width: {ATLAS_CELL}px;\n"
+        "    max-width: 100%;\n"
+        "    aspect-ratio: 1;\n"
+        "    background-repeat: no-repeat;\n"
+        f"    background-size: {ATLAS_COLUMNS * 100}% {rows * 100}%;\n"
+        "}"
+    ]
+    for sheet, thumbnails in sorted(members.items()):
+        name = f'atlas/sheet-{sheet}.webp'
+        digest = hashlib.sha256(repr((ATLAS_COLUMNS, rows, ATLAS_CELL, thumbnails)).encode()).hexdigest()
+        if manifest.source_digest(name) != digest or not manifest.get(name):
+            image = Image.new('RGBA', (ATLAS_COLUMNS * ATLAS_CELL, rows * ATLAS_CELL))
+            for id, thumbnail in thumbnails:
+                _, column, row = atlas_cell(id)
+                with Image.open(os.path.join(manifest.static_dir, thumbnail)) as thumb:
+                    image.paste(thumb.convert('RGBA'), (column * ATLAS_CELL + (ATLAS_CELL - thumb.width) // 2,
+                                                        row * ATLAS_CELL + (ATLAS_CELL - thumb.height) // 2))
+            out = io.BytesIO()
+            image.save(out, 'WEBP', quality=WEBP_QUALITY, method=WEBP_METHOD)
+            manifest.add(name, out.getvalue(), name, digest)
+            drawn += 1
+
+        # The stylesheet is served from the same directory as the sheets.
+        url = os.path.basename(manifest.get(name))
+        rules.append(f".sprite-sheet-{sheet} {{ background-image: url({url}); }}")
+        for id, _ in thumbnails:
+            _, column, row = atlas_cell(id)
+            x = column * 100 / max(ATLAS_COLUMNS - 1, 1)
+            y = row * 100 / max(rows - 1, 1)
+            rules.append(f".sprite-{id} {{ background-position: {x:g}% {y:g}%; }}")
+
+    manifest.add(ATLAS_STYLESHEET, "\n".join(rules).encode() + b"\n")
+    return drawn
+
+
+def format_sprite_report(report):
+    return (f"sprites: {report.pokemon} pokemon, {report.downloaded} downloaded, "
+            f"{report.built} built ({report.bytes / 1024:.0f} KiB), {report.unchanged} unchanged, "
+            f"{report.missing} without artwork, {report.sheets} atlas sheets drawn")
+
+
+def atlas_classes(poke, manifest=None):
+    """CSS classes placing poke's sprite from the atlas, or None if it
+    isn't in the atlas"""
+    manifest = manifest or assets.manifest
+    if not manifest.get(ATLAS_STYLESHEET) or not manifest.get(sprite_name(poke.id, ATLAS_CELL, 'png')):
+        return None
+    return f'sprite sprite-sheet-{atlas_cell(poke.id)[0]} sprite-{poke.id}'
+
+
+def sprite_url(poke, size=SPRITE_SIZES[-1], format='png', manifest=None):
+    """URL of a local thumbnail for poke, or its remote sprite_url if
+    there isn't one"""
+    return (manifest or assets.manifest).url(sprite_name(poke.id, size, format)) or poke.sprite_url
@@ -0,0 +1,141 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import brotli
+
+from models import db, User, Pet, UserBerry
+from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app, CURR_USER_KEY
+import assets
+from assets import build_bundled, fingerprinted_name, static_url
+
+db.drop_all()
+db.create_all()
+
+create_berry_db(db, berries)
+create_type_db(db, types)
+create_pokemon_db(15, db)
+
+
+class AssetsTestCase(TestCase):
+    """Test fingerprinted bundled static files"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, 'static')
+        shutil.copytree(assets.STATIC_DIR, self.static, ignore=shutil.ignore_patterns(assets.BUILD_DIR))
+
+        self.static_folder = app.static_folder
+        app.static_folder = self.static
+        assets.manifest.static_dir = self.static
+        assets.manifest.refresh()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.static_folder = self.static_folder
+        assets.manifest.static_dir = assets.STATIC_DIR
+        assets.manifest.refresh()
+        self.tmp.cleanup()
+
+    def test_build_bundled(self):
+        """Are app.css and every berry image fingerprinted by content?"""
+        self.assertEqual(build_bundled(), 1 + len(berries))
+
+        with open(os.path.join(self.static, 'app.css'), 'rb') as f:
+            css = f.read()
+        self.assertEqual(assets.manifest.get('app.css'), f"build/{fingerprinted_name('app.css', css)}")
+        for berry in berries:
+            self.assertTrue(assets.manifest.get(berry['img_url']))
+
+        with open(os.path.join(self.static, 'app.css'), 'ab') as f:
+            f.write(b'\n.new {}\n')
+        built = assets.manifest.get('app.css')
+        build_bundled()
+        self.assertNotEqual(assets.manifest.get('app.css'), built)
+
+    def test_static_url(self):
+        """Do unbuilt and absolute URLs fall back to the plain ones?"""
+        with app.test_request_context():
+            self.assertEqual(static_url('app.css'), '/static/app.css')
+            self.assertEqual(static_url('https://example.com/berry.png'), 'https://example.com/berry.png')
+            build_bundled()
+            self.assertRegex(static_url('app.css'), r'^/static/build/app\.[0-9a-f]{12}\.css$')
+
+    def test_berry_images(self):
+        """Do pages show the bundled berry images with far-future caching?"""
+        build_bundled()
+        Pet.query.delete()
+        User.query.delete()
+        user = User.signup(username="testuser", email="test@test.com", password="password")
+        db.session.commit()
+        UserBerry.add(user.id, 1, 2)
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session[CURR_USER_KEY] = user.id
+
+        html = self.client.get(f'/users/{user.id}').get_data(as_text=True)
+        with app.test_request_context():
+            berry_url = static_url('images/berries/aspear.png')
+            css_url = static_url('app.css')
+        self.assertIn(f'src="{berry_url}"', html)
+        self.assertIn(f'href="{css_url}"', html)
+        self.assertNotIn('bulbagarden', html)
+
+        resp = self.client.get(berry_url)
+        self.assertEqual(resp.mimetype, 'image/png')
+        self.assertTrue(resp.cache_control.immutable)
+        resp.close()
+
+    def test_precompressed(self):
+        """Are built CSS files served precompressed by Accept-Encoding?"""
+        build_bundled()
+        assets.manifest._loaded = None
+        assets.manifest.refresh()
+        with open(os.path.join(self.static, 'app.css'), 'rb') as f:
+            css = f.read()
+        with app.test_request_context():
+            css_url = static_url('app.css')
+            berry_url = static_url('images/berries/aspear.png')
+
+        for accept, encoding, decompress in (('gzip, deflate, br', 'br', brotli.decompress),
+                                             ('gzip', 'gzip', gzip.decompress)):
+            resp = self.client.get(css_url, headers={'Accept-Encoding': accept})
+            self.assertEqual(resp.headers['Content-Encoding'], encoding)
+            self.assertEqual(resp.mimetype, 'text/css')
+            self.assertEqual(decompress(resp.get_data()), css)
+            self.assertIn('Accept-Encoding', resp.vary)
+            self.assertTrue(resp.cache_control.immutable)
+            resp.close()
+
+        resp = self.client.get(css_url)
+        self.assertNotIn('Content-Encoding', resp.headers)
+        self.assertEqual(resp.get_data(), css)
+        resp.close()
+
+        resp = self.client.get(berry_url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertNotIn('Content-Encoding', resp.headers)
+        resp.close()
+
+    def test_compressed_pokedex(self):
+        """Is the pokedex compressed, still answered with 304, and marked
+        as varying by Accept-Encoding either way?"""
+        resp = self.client.get('/pokedex', headers={'Accept-Encoding': 'gzip'})
+        html = gzip.decompress(resp.get_data())
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'Pokedex', html)
+        etag = resp.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        resp = self.client.get('/pokedex', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertIn('Accept-Encoding', resp.vary)
+
+        resp = self.client.get('/pokedex')
+        self.assertNotIn('Content-Encoding', resp.headers)
+        self.assertIn('Accept-Encoding', resp.vary)
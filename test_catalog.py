@@ -0,0 +1,169 @@
+import os
+import random
+from collections import Counter
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import update
+
+from models import db, User, Pokemon, Pet, Pokedex, CatalogVersion
+from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
+import catalog
+from catalog import AliasTable
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app, CURR_USER_KEY
+
+db.drop_all()
+db.create_all()
+
+create_berry_db(db, berries)
+create_type_db(db, types)
+create_pokemon_db(15, db)
+
+class CatalogTestCase(TestCase):
+    """Test the in-process reference data catalog"""
+    def setUp(self):
+        """Create test client"""
+        Pet.query.delete()
+        User.query.delete()
+
+        self.client = app.test_client()
+
+    def test_catalog_records(self):
+        """Does the catalog mirror the reference tables?"""
+        cat = catalog.get_catalog()
+
+        self.assertEqual(len(cat.pokemon), 15)
+        self.assertEqual(cat.pokemon[1].name, 'bulbasaur')
+        self.assertEqual(cat.pokemon[1].pokedex_id(), '001')
+        self.assertEqual(cat.types['bug'].fav_berry_id, 1)
+        self.assertEqual(cat.berries[1].name, berries[0]['name'])
+        self.assertEqual([poke.id for poke in cat.pokemon_by_type['fire']], [4, 5, 6])
+
+    def test_catalog_cached(self):
+        """Is the catalog loaded once and reused?"""
+        self.assertIs(catalog.get_catalog(), catalog.get_catalog())
+
+    def test_catalog_version_bump(self):
+        """Does a version bump reload the catalog?"""
+        old = catalog.get_catalog()
+        db.session.get(Pokemon, 1).name = 'renamed'
+        db.session.commit()
+
+        self.assertEqual(catalog.get_catalog().pokemon[1].name, 'bulbasaur')
+
+        catalog.bump_version()
+        db.session.commit()
+        self.assertIsNot(catalog.get_catalog(), old)
+        self.assertEqual(catalog.get_catalog().pokemon[1].name, 'renamed')
+
+        create_pokemon_db(15, db)
+
+    def test_catalog_shared_version(self):
+        """Does a seed committed by another process reach this worker?"""
+        old = catalog.get_catalog()
+        db.session.get(Pokemon, 1).name = 'renamed'
+        db.session.execute(update(CatalogVersion).values(version=CatalogVersion.version + 1))
+        db.session.commit()
+
+        self.assertIs(catalog.get_catalog(), old)
+        with patch.object(catalog, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(catalog.get_catalog().version, catalog.stored_version())
+            self.assertEqual(catalog.get_catalog().pokemon[1].name, 'renamed')
+
+        create_pokemon_db(15, db)
+
+    def test_pokedex_seen(self):
+        """Does the pokedex reveal only pokemon the user has seen?"""
+        user = User(username="testuser", email="test@test.com", password="HASHED_PASSWORD")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Pokedex(user_id=user.id, pokemon_seen_id=4))
+        db.session.commit()
+
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = user.id
+            html = client.get('/pokedex').get_data(as_text=True)
+
+        self.assertIn('<h3>#004 Charmander</h3>', html)
+        self.assertEqual(html.count('<h3>#??? ???????</h3>'), 14)
+
+    def test_pokemon_page(self):
+        """Does keyset paging walk the catalog without gaps?"""
+        cat = catalog.get_catalog()
+        page, next_after = cat.pokemon_page(limit=10)
+        rest, last = cat.pokemon_page(next_after, limit=10)
+
+        self.assertEqual([poke.id for poke in page + rest], list(range(1, 16)))
+        self.assertEqual(next_after, 10)
+        self.assertIsNone(last)
+
+    def test_pokedex_type(self):
+        """Does the type filter show only that type?"""
+        html = self.client.get('/pokedex?type=fire').get_data(as_text=True)
+
+        self.assertEqual(html.count('<h3>#??? ???????</h3>'), 3)
+        self.assertNotIn('pokedex-list', self.client.get('/pokedex?type=shadow').get_data(as_text=True))
+
+    def test_pokedex_etag(self):
+        """Does an unchanged pokedex page answer 304 with no body?"""
+        resp = self.client.get('/pokedex')
+        etag = resp.headers['ETag']
+
+        resp = self.client.get('/pokedex', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.get_data(), b'')
+
+        catalog.bump_version()
+        db.session.commit()
+        resp = self.client.get('/pokedex', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+
+        user = User(username="testuser", email="test@test.com", password="HASHED_PASSWORD")
+        db.session.add(user)
+        db.session.commit()
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = user.id
+            resp = client.get('/pokedex', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+
+
+class AliasTableTestCase(TestCase):
+    """Test weighted sampling with the alias table"""
+
+    def test_alias_distribution(self):
+        """Do draws follow the weights? (chi-square, 9 d.o.f., p=0.001)"""
+        weights = [1, 2, 3, 4, 5, 0.5, 0.25, 10, 7, 1.25]
+        table = AliasTable(range(len(weights)), weights)
+        rng = random.Random(16)
+        draws = 100000
+
+        counts = Counter(table.draw(rng) for _ in range(draws))
+        total = sum(weights)
+        chi_square = sum(
+            (counts[i] - draws * weight / total) ** 2 / (draws * weight / total)
+            for i, weight in enumerate(weights)
+        )
+
+        self.assertLess(chi_square, 27.88)
+
+    def test_alias_sample(self):
+        """Does sample return distinct items and skip zero weights?"""
+        table = AliasTable('abcd', [1, 1, 1, 0])
+
+        self.assertEqual(sorted(table.sample(3)), ['a', 'b', 'c'])
+        self.assertEqual(len(table.sample(4)), 3)
+        self.assertEqual(table.sample(3, random.Random(1)), table.sample(3, random.Random(1)))
+        self.assertEqual(AliasTable([], []).sample(3), [])
+
+    def test_catalog_rarity(self):
+        """Are rarer pokemon weighted lower?"""
+        pokemon = catalog.get_catalog().pokemon
+
+        self.assertEqual(pokemon[1].rarity_weight, 1.0)
+        self.assertLess(pokemon[3].rarity_weight, pokemon[2].rarity_weight)
@@ -0,0 +1,126 @@
+import gzip
+import zlib
+from unittest import TestCase
+
+import brotli
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from compression import CompressionMiddleware, negotiate
+
+PAGE = b"<html><body>" + b"<p>Pokepets!</p>" * 500 + b"</body></html>"
+
+
+def html_app(body, content_type='text/html; charset=utf-8', **headers):
+    """WSGI app that returns body, which may be a list of chunks"""
+    def app(environ, start_response):
+        resp = Response(body, content_type=content_type, headers=headers)
+        return resp(environ, start_response)
+    return app
+
+
+class CompressionTestCase(TestCase):
+    """Test response compression"""
+    def test_negotiate(self):
+        """Is the best encoding the client accepts picked?"""
+        self.assertEqual(negotiate("gzip, deflate, br"), 'br')
+        self.assertEqual(negotiate("gzip"), 'gzip')
+        self.assertEqual(negotiate("br;q=0, gzip"), 'gzip')
+        self.assertEqual(negotiate("gzip;q=0.5, br;q=0.4"), 'gzip')
+        self.assertEqual(negotiate("*"), 'br')
+        self.assertIsNone(negotiate("identity"))
+        self.assertIsNone(negotiate(None))
+
+    def test_compress_html(self):
+        """Is large HTML compressed, with a weak ETag and Vary?"""
+        client = Client(CompressionMiddleware(html_app(PAGE, ETag='"abc"', Vary='Cookie')))
+
+        resp = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(resp.get_data()), PAGE)
+        self.assertLess(len(resp.get_data()), len(PAGE) / 10)
+        self.assertEqual(resp.headers['ETag'], 'W/"abc"')
+        self.assertEqual(resp.headers['Vary'], 'Cookie, Accept-Encoding')
+        self.assertNotIn('Content-Length', resp.headers)
+
+        resp = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(brotli.decompress(resp.get_data()), PAGE)
+
+        resp = client.get('/')
+        self.assertNotIn('Content-Encoding', resp.headers)
+        self.assertEqual(resp.get_data(), PAGE)
+
+    def test_skip(self):
+        """Are other types and encoded responses left alone?"""
+        for app in (html_app(PAGE, 'text/css'),
+                    html_app(PAGE, **{'Content-Encoding': 'br'}),
+                    html_app(PAGE, **{'Cache-Control': 'no-transform'})):
+            resp = Client(CompressionMiddleware(app)).get('/', headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Vary', resp.headers)
+            self.assertEqual(resp.get_data(), PAGE)
+
+    def test_vary_uncompressed(self):
+        """Does HTML sent uncompressed still vary by Accept-Encoding?"""
+        for app, headers in ((html_app(b"<p>hi</p>"), {'Accept-Encoding': 'gzip'}),
+                             (html_app(PAGE), {})):
+            resp = Client(CompressionMiddleware(app)).get('/', headers=headers)
+            self.assertNotIn('Content-Encoding', resp.headers)
+            self.assertEqual(resp.headers['Vary'], 'Accept-Encoding')
+
+    def test_write(self):
+        """Is output from the write() callable compressed ahead of the body?"""
+        def app(environ, start_response):
+            write = start_response('200 OK', [('Content-Type', 'text/html')])
+            write(PAGE[:100])
+            return [PAGE[100:]]
+
+        resp = Client(CompressionMiddleware(app)).get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(resp.get_data()), PAGE)
+
+    def test_streaming(self):
+        """Does each chunk come out as soon as the app yields it?"""
+        chunks = [PAGE, b"<p>later</p>" * 100]
+        yielded = []
+
+        def body():
+            for chunk in chunks:
+                yielded.append(chunk)
+                yield chunk
+
+        client = Client(CompressionMiddleware(html_app(body())))
+        resp = client.get('/', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        out = iter(resp.response)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        self.assertEqual(decompressor.decompress(next(out)), chunks[0])
+        self.assertEqual(len(yielded), 1)
+        self.assertEqual(decompressor.decompress(b"".join(out)), chunks[1])
+        resp.close()
+
+    def test_lazy_start_response(self):
+        """Does an app that starts its response from inside its body work
+        whether or not the client accepts an encoding?"""
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            yield PAGE
+
+        client = Client(CompressionMiddleware(app))
+        self.assertEqual(client.get('/').get_data(), PAGE)
+        self.assertEqual(client.head('/').status_code, 200)
+        resp = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(resp.get_data()), PAGE)
+
+    def test_passthrough(self):
+        """Is a non-HTML app iterable, like a file wrapper, handed back as it is?"""
+        body = [b"body {}"]
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/css')])
+            return body
+
+        started = []
+        environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}
+        result = CompressionMiddleware(app)(environ, lambda status, headers: started.append(status))
+        self.assertIs(result, body)
+        self.assertEqual(started, ['200 OK'])
@@ -1,10 +1,14 @@
 import os
+from datetime import datetime, timedelta, timezone
 from unittest import TestCase
 
+from sqlalchemy import update
+
 from models import db, User, Pokemon, Pet, Berry, Pokedex, Berrydex, UserBerry
 from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
 
 os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
 
 from app import app 
 
@@ -218,4 +222,109 @@ class PetModelTestCase(TestCase):
         db.session.add(p)
         db.session.commit()
 
-        self.assertEqual(p.pokemon, Pokemon.query.get_or_404(1))
\ No newline at end of file
+        self.assertEqual(p.pokemon, Pokemon.query.get_or_404(1))
+
+    def test_pet_change_stats(self):
+        """Does change_stats apply several deltas and clamp them?"""
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+        p = Pet(
+            id=1,
+            nickname="testpet",
+            user_id=1,
+            poke_id=1
+        )
+        db.session.add(p)
+        db.session.commit()
+        p.change_stats(hunger=80, happiness=-70)
+        db.session.commit()
+
+        self.assertEqual((p.hunger, p.happiness), (100, 0))
+        self.assertEqual(db.session.query(Pet.hunger, Pet.happiness).filter_by(id=1).one(), (100, 0))
+
+    def test_pet_decay(self):
+        """Do stats decay over time, the same in Python and SQL?"""
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+        p = Pet(
+            id=1,
+            nickname="testpet",
+            user_id=1,
+            poke_id=1,
+            hunger_since=datetime.now(timezone.utc) - timedelta(hours=10),
+            happiness_since=datetime.now(timezone.utc) - timedelta(hours=10)
+        )
+        db.session.add(p)
+        db.session.commit()
+
+        self.assertEqual((p.current_hunger, p.current_happiness), (30, 40))
+        self.assertEqual(db.session.query(Pet.current_hunger, Pet.current_happiness).filter_by(id=1).one(), (30, 40))
+        self.assertEqual((p.hunger, p.happiness), (50, 50))
+
+        p.change_stats(hunger=10)
+        db.session.commit()
+
+        self.assertEqual((p.hunger, p.happiness), (40, 40))
+        self.assertEqual((p.current_hunger, p.current_happiness), (40, 40))
+
+    def test_pet_decay_frequent_care(self):
+        """Does decay keep building up when the pet is cared for often?"""
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+        p = Pet(id=1, nickname="testpet", user_id=1, poke_id=1)
+        db.session.add(p)
+        db.session.commit()
+
+        def twenty_minutes_pass():
+            db.session.execute(update(Pet).where(Pet.id == 1).values(
+                hunger_since=Pet.hunger_since - timedelta(minutes=20),
+                happiness_since=Pet.happiness_since - timedelta(minutes=20)))
+
+        # Hunger decays 2 points an hour, so each 20 minutes is 2/3 of a point.
+        twenty_minutes_pass()
+        p.change_stats()
+        db.session.commit()
+        self.assertEqual((p.hunger, p.happiness), (50, 50))
+
+        twenty_minutes_pass()
+        p.change_stats()
+        db.session.commit()
+        self.assertEqual((p.hunger, p.happiness), (49, 50))
+        self.assertEqual(db.session.query(Pet.current_hunger).filter_by(id=1).scalar(), 49)
+
+    def test_pet_random_sample(self):
+        """Does random_sample return distinct pets, wrapping around the key?"""
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+        db.session.add_all([Pet(nickname=f"testpet{i}", user_id=1, poke_id=1, random_key=i / 20) for i in range(20)])
+        db.session.commit()
+
+        sample = Pet.random_sample(5)
+        self.assertEqual(len({pet.id for pet in sample}), 5)
+
+        everyone = Pet.random_sample(30)
+        self.assertEqual(len({pet.id for pet in everyone}), 20)
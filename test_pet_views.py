@@ -1,12 +1,15 @@
 import os
+import time
 from unittest import TestCase
+from unittest.mock import patch
 
 from models import db, User, Pokemon, Pet, Berry, Pokedex, Berrydex, UserBerry
 from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
 
 os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
 
-from app import app, CURR_USER_KEY
+from app import app, CURR_USER_KEY, ADOPTION_OFFER_KEY
 
 db.drop_all()
 db.create_all()
@@ -39,12 +42,67 @@ class PetViewsTestCase(TestCase):
         with self.client as client:
             with client.session_transaction() as session:
                 session[CURR_USER_KEY] = self.testuser.id
+                session[ADOPTION_OFFER_KEY] = {'user_id': self.testuser.id, 'ids': [1], 'expires': time.time() + 60}
 
         resp = client.post('/pets/adopt/1', data={"nickname": "testpet"})
 
         self.assertEqual(resp.status_code, 302)
         self.assertEqual(len(self.testuser.pets), 1)
 
+    def test_adopt_not_offered(self):
+        """Can a user only adopt pokemon they've been offered?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+                session[ADOPTION_OFFER_KEY] = {'user_id': self.testuser.id, 'ids': [1], 'expires': time.time() - 60}
+
+        resp = client.post('/pets/adopt/2', data={"nickname": "testpet"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp.location, '/pets/adopt')
+        self.assertEqual(Pet.query.count(), 0)
+
+        # An offer that expired moments ago can still be taken up, once.
+        resp = client.post('/pets/adopt/1', data={"nickname": "testpet"})
+        self.assertEqual(Pet.query.count(), 1)
+        with patch('catalog.AliasTable.sample', return_value=[2, 3, 4]):
+            resp = client.post('/pets/adopt/1', data={"nickname": "testpet2"})
+        self.assertEqual(resp.location, '/pets/adopt')
+        self.assertEqual(Pet.query.count(), 1)
+
+    def test_adopt_offer_grace(self):
+        """Is an offer refused once its grace period has passed?"""
+        expired = time.time() - app.config['ADOPTION_OFFER_GRACE'] - 60
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+                session[ADOPTION_OFFER_KEY] = {'user_id': self.testuser.id, 'ids': [1], 'expires': expired}
+
+            with patch('catalog.AliasTable.sample', return_value=[2, 3, 4]):
+                resp = client.post('/pets/adopt/1', data={"nickname": "testpet"})
+        self.assertEqual(resp.location, '/pets/adopt')
+        self.assertEqual(Pet.query.count(), 0)
+
+    def test_adoption_offer_cached(self):
+        """Does reloading the adoption center show the same offer?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+
+            client.get('/pets/adopt')
+            with client.session_transaction() as session:
+                offer = session[ADOPTION_OFFER_KEY]
+            client.get('/pets/adopt')
+            with client.session_transaction() as session:
+                self.assertEqual(session[ADOPTION_OFFER_KEY], offer)
+                session[ADOPTION_OFFER_KEY] = dict(offer, expires=0)
+
+            client.get('/pets/adopt')
+            with client.session_transaction() as session:
+                self.assertGreater(session[ADOPTION_OFFER_KEY]['expires'], time.time())
+
+        self.assertEqual(len(offer['ids']), 3)
+        self.assertTrue(set(offer['ids']) <= set(range(1, 16)))
+
     def test_user_release(self):
         """Can user remove a pet?"""
         with self.client as client:
@@ -69,6 +127,7 @@ class PetViewsTestCase(TestCase):
         with self.client as client:
             with client.session_transaction() as session:
                 session[CURR_USER_KEY] = self.testuser.id
+                session[ADOPTION_OFFER_KEY] = {'user_id': self.testuser.id, 'ids': [1], 'expires': time.time() + 60}
 
         user2 = User(
             id= 2,
@@ -128,6 +187,31 @@ class PetViewsTestCase(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(pet.hunger, 60)
 
+    def test_feed_pet_berry(self):
+        """Does feeding a berry use one from the inventory?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        pet = Pet(
+            id = 1,
+            nickname= "testpet",
+            user_id = self.testuser.id,
+            poke_id = 1,
+        )
+        db.session.add(pet)
+        UserBerry.add(self.testuser.id, 1, 2)
+        db.session.commit()
+
+        resp = client.post(f'/feed_pet_berry/1/1', follow_redirects=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(UserBerry.query.get((self.testuser.id, 1)).quantity, 1)
+
+        client.post(f'/feed_pet_berry/1/1')
+        self.assertIsNone(UserBerry.query.get((self.testuser.id, 1)))
+
+        client.post(f'/feed_pet_berry/1/1')
+        self.assertEqual(Pet.query.get(1).hunger, 80)
+
     def test_play_pet_stats(self):
         """Does playing with pet alter stats?"""
         with self.client as client:
@@ -165,3 +249,146 @@ class PetViewsTestCase(TestCase):
         
         self.assertEqual(resp.status_code, 200)
         self.assertNotEqual(pet.happiness, 50)
+
+    def test_expedition(self):
+        """Can several pets go foraging at once?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        db.session.add_all([
+            Pet(id=1, nickname="testpet1", user_id=self.testuser.id, poke_id=1),
+            Pet(id=2, nickname="testpet2", user_id=self.testuser.id, poke_id=2),
+            Pet(id=3, nickname="testpet3", user_id=self.testuser.id, poke_id=3, hunger=5),
+            Pet(id=4, nickname="testpet4", user_id=self.testuser.id, poke_id=4),
+        ])
+        db.session.commit()
+
+        resp = client.post('/foraging/expedition', data={"pets": ["1", "2", "3"]})
+        self.assertEqual(resp.status_code, 302)
+
+        stats = {id: (hunger, happiness) for id, hunger, happiness in db.session.query(Pet.id, Pet.hunger, Pet.happiness)}
+        self.assertEqual(stats[1][0], 20)
+        self.assertEqual(stats[2][0], 20)
+        self.assertEqual(stats[3], (5, 45))
+        self.assertEqual(stats[4], (50, 50))
+        found = sum(1 for id in (1, 2) if stats[id][1] == 100)
+        self.assertEqual(sum(item.quantity for item in UserBerry.query.filter_by(user_id=self.testuser.id)), found)
+
+    def test_expedition_other(self):
+        """Can a user send another account's pet foraging?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        user2 = User.signup(username="testuser2", email="test2@test.com", password="password")
+        db.session.commit()
+        db.session.add(Pet(id=1, nickname="testpet", user_id=user2.id, poke_id=1))
+        db.session.commit()
+
+        resp = client.post('/foraging/expedition', data={"pets": ["1"]})
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Pet.query.get(1).hunger, 50)
+
+    def test_adopt_nickname_taken(self):
+        """Is a nickname taken regardless of case?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+                session[ADOPTION_OFFER_KEY] = {'user_id': self.testuser.id, 'ids': [1], 'expires': time.time() + 60}
+        pet = Pet(
+            id = 1,
+            nickname= "testpet",
+            user_id = self.testuser.id,
+            poke_id = 1,
+        )
+        db.session.add(pet)
+        db.session.commit()
+
+        resp = client.post('/pets/adopt/1', data={"nickname": "TestPet"})
+        html = resp.get_data(as_text=True)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("already taken", html)
+        self.assertEqual(Pet.query.count(), 1)
+
+    def test_suggest_nicknames(self):
+        """Does the suggestion endpoint only offer free nicknames?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        db.session.add_all([
+            Pet(nickname="testpet", user_id=self.testuser.id, poke_id=1),
+            Pet(nickname="testpet2", user_id=self.testuser.id, poke_id=1),
+        ])
+        db.session.commit()
+
+        resp = client.get('/pets/nicknames/suggest?nickname=TESTPET&poke_id=1')
+        data = resp.get_json()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(data['available'])
+        self.assertEqual(len(data['suggestions']), 3)
+        self.assertNotIn('testpet2', [name.lower() for name in data['suggestions']])
+        self.assertTrue(all(len(name) <= 20 for name in data['suggestions']))
+
+    def test_api_pet_etag(self):
+        """Does the pet API answer If-None-Match with 304 until a stat changes?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        db.session.add(Pet(id=1, nickname="testpet", user_id=self.testuser.id, poke_id=1))
+        db.session.commit()
+
+        resp = client.get('/api/v1/pets/1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['hunger'], 50)
+        etag = resp.headers['ETag']
+
+        resp = client.get('/api/v1/pets/1', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+
+        resp = client.post('/api/v1/pets/1/play', json={})
+        data = resp.get_json()
+        self.assertEqual(data['changed'], {'hunger': 40, 'happiness': 60})
+        self.assertEqual(data['messages'][0]['category'], "SUCCESS")
+
+        resp = client.get('/api/v1/pets/1', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_api_feed_berry(self):
+        """Does feeding a berry through the API return what's left?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        db.session.add(Pet(id=1, nickname="testpet", user_id=self.testuser.id, poke_id=1))
+        UserBerry.add(self.testuser.id, 1, 1)
+        db.session.commit()
+
+        resp = client.post('/api/v1/pets/1/feed/1', json={})
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(data['berry'], {'id': 1, 'quantity': 0})
+        self.assertEqual(data['changed'], {'hunger': 65})
+
+        resp = client.post('/api/v1/pets/1/feed/1', json={})
+        self.assertEqual(resp.status_code, 404)
+
+        resp = client.post('/api/v1/pets/1/feed')
+        self.assertEqual(resp.status_code, 415)
+        self.assertEqual(Pet.query.get(1).hunger, 65)
+
+    def test_api_pet_other(self):
+        """Can a user read or care for another account's pet through the API?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        user2 = User.signup(username="testuser2", email="test2@test.com", password="password")
+        db.session.commit()
+        db.session.add(Pet(id=1, nickname="testpet", user_id=user2.id, poke_id=1))
+        db.session.commit()
+
+        self.assertEqual(client.get('/api/v1/pets/1').status_code, 403)
+        self.assertEqual(client.post('/api/v1/pets/1/feed', json={}).status_code, 403)
+        self.assertEqual(client.get('/api/v1/pets/2').status_code, 404)
+        self.assertEqual(Pet.query.get(1).hunger, 50)
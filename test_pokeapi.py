@@ -0,0 +1,82 @@
+import json
+import tempfile
+from unittest import TestCase
+
+from pokeapi import ResponseCache, CacheMissError, cached_run, fetch_all_pokemon, parse_pokemon, CACHE_VERSION
+
+
+def raw_pokemon(id, name):
+    """A trimmed-down raw API response with some fields we don't keep"""
+    return {
+        'id': id,
+        'name': name,
+        'base_experience': 64,
+        'moves': [{'move': {'name': 'tackle'}}],
+        'sprites': {'front_default': 'small.png',
+                    'other': {'official-artwork': {'front_default': f'{id}.png'}}},
+        'types': [{'slot': 1, 'type': {'name': 'grass', 'url': 'x'}}]
+    }
+
+
+class ResponseCacheTestCase(TestCase):
+    """Test the on-disk PokeAPI cache"""
+    def setUp(self):
+        """Use an empty cache directory per test"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_get(self):
+        """Does a stored response come back compacted?"""
+        self.cache.put('pokemon/1', raw_pokemon(1, 'bulbasaur'))
+        data = ResponseCache(self.tmp.name).get('pokemon/1')
+
+        self.assertNotIn('moves', data)
+        self.assertEqual(parse_pokemon(data),
+                         {'id': 1, 'name': 'bulbasaur', 'sprite_url': '1.png', 'type': 'grass'})
+
+    def test_content_addressed(self):
+        """Do identical responses share one object file?"""
+        self.cache.put('pokemon/1', raw_pokemon(1, 'bulbasaur'))
+        self.cache.put('pokemon/bulbasaur', raw_pokemon(1, 'bulbasaur'))
+
+        self.assertEqual(self.cache.entries['pokemon/1'], self.cache.entries['pokemon/bulbasaur'])
+
+    def test_version_mismatch(self):
+        """Is a cache written with another format version ignored?"""
+        self.cache.put('pokemon/1', raw_pokemon(1, 'bulbasaur'))
+        with open(self.cache.index_path) as f:
+            index = json.load(f)
+        index['version'] = CACHE_VERSION + 1
+        with open(self.cache.index_path, 'w') as f:
+            json.dump(index, f)
+
+        self.assertIsNone(ResponseCache(self.tmp.name).get('pokemon/1'))
+
+    def test_replay(self):
+        """Does replay mode read from the cache without the network?"""
+        self.cache.put('pokemon/1', raw_pokemon(1, 'bulbasaur'))
+        self.cache.put('pokemon/2', raw_pokemon(2, 'ivysaur'))
+        data = fetch_all_pokemon([2, 1], mode='replay', cache=self.cache, base_url='http://invalid/')
+
+        self.assertEqual([d['name'] for d in data], ['ivysaur', 'bulbasaur'])
+
+    def test_replay_miss(self):
+        """Does replay mode refuse to go to the network on a miss?"""
+        with self.assertRaises(CacheMissError):
+            fetch_all_pokemon([1], mode='replay', cache=self.cache, base_url='http://invalid/')
+
+    def test_cached_run(self):
+        """Does the cached run stop at the first missing id?"""
+        for id in (1, 2, 4):
+            self.cache.put(f'pokemon/{id}', raw_pokemon(id, 'bulbasaur'))
+
+        self.assertEqual(cached_run(self.cache), 2)
+
+    def test_bundled_cache(self):
+        """Does the bundled cache cover the pokemon the tests seed?"""
+        data = fetch_all_pokemon(range(1, 16), mode='replay', cache=ResponseCache())
+
+        self.assertEqual(len(data), 15)
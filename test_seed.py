@@ -0,0 +1,53 @@
+import os
+from unittest import TestCase
+
+from models import db, Pokemon, Berry, Type
+from functions import seed_reference_data, reference_data_ready, berries, types
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app
+
+db.drop_all()
+db.create_all()
+
+
+class SeedTestCase(TestCase):
+    """Test bulk reference data seeding"""
+    def test_seed_counts(self):
+        """Does seeding load every table and report it?"""
+        report = seed_reference_data(db, max_pokemon=15)
+
+        self.assertEqual([(table, count) for table, count, seconds in report],
+                         [('berries', len(berries)), ('types', len(types)), ('pokemons', 15)])
+        self.assertEqual(Pokemon.query.count(), 15)
+
+    def test_seed_replay_default(self):
+        """Does a replay seed with the default 150 stop at the cached pokemon?"""
+        report = seed_reference_data(db)
+
+        self.assertEqual(report[-1][:2], ('pokemons', 15))
+        self.assertEqual(Pokemon.query.count(), 15)
+
+    def test_seed_idempotent(self):
+        """Can seeding be re-run without duplicating rows?"""
+        seed_reference_data(db, max_pokemon=15)
+        seed_reference_data(db, max_pokemon=15)
+
+        self.assertEqual(Berry.query.count(), len(berries))
+        self.assertEqual(Type.query.count(), len(types))
+        self.assertEqual(Pokemon.query.count(), 15)
+
+    def test_seed_berry_ids(self):
+        """Do berries keep the list-order ids the types refer to?"""
+        seed_reference_data(db, max_pokemon=15)
+
+        self.assertEqual(db.session.get(Berry, 1).name, berries[0]['name'])
+        self.assertEqual(db.session.get(Type, 'bug').fav_berry_id, 1)
+
+    def test_reference_data_ready(self):
+        """Does the startup probe see seeded tables?"""
+        seed_reference_data(db, max_pokemon=15)
+
+        self.assertTrue(reference_data_ready(db))
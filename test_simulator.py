@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+import numpy as np
+
+from functions import FORAGE_ROLL, FORAGE_FAIL_BELOW, BERRY_ROLL
+from models import STAT_MIN, STAT_MAX
+from simulator import simulate
+
+
+class SimulatorTestCase(TestCase):
+    """Test the forage and care simulator"""
+    def setUp(self):
+        self.result = simulate(pets=20000, steps=10, seed=18)
+
+    def test_stats_clamped(self):
+        """Do simulated stats stay within the app's bounds?"""
+        for stat in (self.result.hunger, self.result.happiness):
+            self.assertGreaterEqual(stat.min(), STAT_MIN)
+            self.assertLessEqual(stat.max(), STAT_MAX)
+
+    def test_forage_odds(self):
+        """Do simulated trips fail as often as functions.forage does?"""
+        events = self.result.events
+        trips = events['forage_empty'] + events['forage_found']
+        expected = (FORAGE_FAIL_BELOW - 1) / (FORAGE_ROLL - 1)
+
+        self.assertAlmostEqual(events['forage_empty'] / trips, expected, delta=0.01)
+
+    def test_berries_found(self):
+        """Are only berries functions.forage can roll found?"""
+        found = self.result.found
+
+        self.assertEqual(np.flatnonzero(found).tolist(), list(range(1, BERRY_ROLL)))
+        self.assertEqual(int(found.sum()), self.result.events['forage_found'])
+        self.assertGreaterEqual(self.result.inventory.min(), 0)
@@ -0,0 +1,200 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+
+from PIL import Image
+
+from models import db, Pet, User
+from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
+from catalog import PokemonRecord
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app, CURR_USER_KEY, ADOPTION_OFFER_KEY
+import assets
+from sprites import (
+    build_sprites, make_thumbnails, original_path, sprite_name, sprite_url, atlas_cell, SPRITE_SIZES,
+    ATLAS_SHEET_SIZE, ATLAS_STYLESHEET
+)
+
+db.drop_all()
+db.create_all()
+
+create_berry_db(db, berries)
+create_type_db(db, types)
+create_pokemon_db(15, db)
+
+
+def artwork(color, size=475):
+    """A stand-in for the official artwork: a shape on a transparent square"""
+    image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    image.paste(color, (size // 4, size // 4, size * 3 // 4, size * 3 // 4))
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    return out.getvalue()
+
+
+def poke(id):
+    return PokemonRecord(id, f'poke{id}', f'https://example.com/{id}.png', 'grass', 2.0, 1.0, 1.0)
+
+
+class SpritesTestCase(TestCase):
+    """Test the local sprite thumbnails"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sources = os.path.join(self.tmp.name, 'originals')
+        self.static = os.path.join(self.tmp.name, 'static')
+        os.makedirs(self.sources)
+        for id, color in ((1, (255, 0, 0, 255)), (2, (0, 0, 255, 255)), (ATLAS_SHEET_SIZE + 1, (0, 0, 0, 255))):
+            with open(original_path(id, self.sources), 'wb') as f:
+                f.write(artwork(color))
+
+        self.static_folder = app.static_folder
+        app.static_folder = self.static
+        assets.manifest.static_dir = self.static
+        assets.manifest.refresh()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.static_folder = self.static_folder
+        assets.manifest.static_dir = assets.STATIC_DIR
+        assets.manifest.refresh()
+        self.tmp.cleanup()
+
+    def test_make_thumbnails(self):
+        """Is every size made in every format, fitted to the size?"""
+        thumbnails = make_thumbnails(artwork((255, 0, 0, 255)))
+
+        self.assertEqual(len(thumbnails), len(SPRITE_SIZES) * 2)
+        for (size, format), data in thumbnails.items():
+            image = Image.open(io.BytesIO(data))
+            self.assertEqual(image.format, format.upper())
+            self.assertEqual(image.size, (size, size))
+
+    def test_build_sprites(self):
+        """Are only new or changed originals rebuilt?"""
+        pokemon = [poke(1), poke(2), poke(3)]
+        report = build_sprites(pokemon, directory=self.sources, mode='replay')
+        self.assertEqual((report.built, report.unchanged, report.missing), (2, 0, 1))
+        self.assertEqual(report.sheets, 1)
+
+        name = sprite_name(1, SPRITE_SIZES[0], 'webp')
+        built = assets.manifest.get(name)
+        self.assertTrue(os.path.exists(os.path.join(self.static, built)))
+
+        with open(original_path(1, self.sources), 'wb') as f:
+            f.write(artwork((0, 255, 0, 255)))
+        report = build_sprites(pokemon, directory=self.sources, mode='replay')
+        self.assertEqual((report.built, report.unchanged, report.missing), (1, 1, 1))
+        self.assertNotEqual(assets.manifest.get(name), built)
+
+    def test_sprite_url(self):
+        """Do pokemon without a thumbnail keep their remote URL?"""
+        build_sprites([poke(1)], directory=self.sources, mode='replay')
+
+        with app.test_request_context():
+            self.assertTrue(sprite_url(poke(1)).startswith('/static/build/sprites/1-256.'))
+            self.assertEqual(sprite_url(poke(2)), 'https://example.com/2.png')
+
+    def test_fetch_failure(self):
+        """Does artwork that can't be fetched count as missing without
+        stopping the build?"""
+        class ArtworkHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/4.png':
+                    self.send_response(200)
+                    self.end_headers()
+                    self.wfile.write(artwork((255, 0, 0, 255)))
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), ArtworkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f'http://127.0.0.1:{server.server_port}'
+        pokemon = [poke(id)._replace(sprite_url=f'{base}/{id}.png') for id in (3, 4)]
+
+        report = build_sprites(pokemon, directory=self.sources, mode='cache')
+        self.assertEqual((report.downloaded, report.built, report.missing), (1, 1, 1))
+        self.assertTrue(assets.manifest.get(sprite_name(4, SPRITE_SIZES[0], 'webp')))
+
+    def test_immutable_headers(self):
+        """Are fingerprinted files served with far-future cache headers?"""
+        build_sprites([poke(1)], directory=self.sources, mode='replay')
+        with open(os.path.join(self.static, 'app.css'), 'w') as f:
+            f.write('body {}')
+
+        with app.test_request_context():
+            url = sprite_url(poke(1), format='webp')
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'image/webp')
+        self.assertTrue(resp.cache_control.immutable)
+        self.assertEqual(resp.cache_control.max_age, assets.IMMUTABLE_MAX_AGE)
+        resp.close()
+
+        resp = self.client.get('/static/app.css')
+        self.assertFalse(resp.cache_control.immutable)
+        resp.close()
+
+    def test_build_atlas(self):
+        """Is only the atlas sheet holding a changed sprite redrawn?"""
+        pokemon = [poke(1), poke(2), poke(ATLAS_SHEET_SIZE + 1)]
+        report = build_sprites(pokemon, directory=self.sources, mode='replay')
+        self.assertEqual(report.sheets, 2)
+        sheet = assets.manifest.get('atlas/sheet-0.webp')
+        image = Image.open(os.path.join(self.static, sheet))
+        # Sheets are lossy WebP, so colours are only close.
+        red, _, blue, alpha = image.getpixel((128, 128))
+        self.assertGreater(red, 240)
+        self.assertEqual(alpha, 255)
+        red, _, blue, alpha = image.getpixel((256 + 128, 128))
+        self.assertGreater(blue, 240)
+        self.assertEqual(image.getpixel((5, 5))[3], 0)
+
+        self.assertEqual(build_sprites(pokemon, directory=self.sources, mode='replay').sheets, 0)
+
+        with open(original_path(ATLAS_SHEET_SIZE + 1, self.sources), 'wb') as f:
+            f.write(artwork((0, 255, 0, 255)))
+        report = build_sprites(pokemon, directory=self.sources, mode='replay')
+        self.assertEqual(report.sheets, 1)
+        self.assertEqual(assets.manifest.get('atlas/sheet-0.webp'), sheet)
+
+        with open(os.path.join(self.static, assets.manifest.get(ATLAS_STYLESHEET))) as f:
+            css = f.read()
+        self.assertEqual(atlas_cell(ATLAS_SHEET_SIZE + 1), (1, 0, 0))
+        self.assertIn(".sprite-2 { background-position: 11.1111% 0%; }", css)
+        self.assertIn(f".sprite-sheet-1 {{ background-image: url({os.path.basename(assets.manifest.get('atlas/sheet-1.webp'))}); }}", css)
+
+    def test_pokedex_atlas(self):
+        """Does the pokedex use the atlas, and thumbnails for the rest?"""
+        Pet.query.delete()
+        User.query.delete()
+        db.session.commit()
+        build_sprites([poke(1)], directory=self.sources, mode='replay')
+
+        html = self.client.get('/pokedex').get_data(as_text=True)
+        self.assertIn('class="sprite sprite-sheet-0 sprite-1 poke-img unknown"', html)
+        self.assertIn('/static/build/atlas/sprites.', html)
+        self.assertNotIn('/static/build/sprites/', html)
+
+        with self.client.session_transaction() as session:
+            session[ADOPTION_OFFER_KEY] = {'user_id': None, 'ids': [1], 'expires': time.time() + 60}
+        user = User.signup(username="testuser", email="test@test.com", password="password")
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session[CURR_USER_KEY] = user.id
+        db.session.add(Pet(nickname="testpet", user_id=user.id, poke_id=1))
+        db.session.commit()
+        html = self.client.get(f'/users/{user.id}').get_data(as_text=True)
+        self.assertIn('/static/build/sprites/1-256.', html)
+        self.assertIn('type="image/webp"', html)
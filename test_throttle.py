@@ -0,0 +1,101 @@
+import os
+from unittest import TestCase
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from models import db, User, ThrottleBucket
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app, login_throttle
+from throttle import Limit, LoginThrottle, MemoryBackend, DatabaseBackend
+
+db.create_all()
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ThrottleTestCase(TestCase):
+    """Test the login throttle"""
+    def setUp(self):
+        ThrottleBucket.query.delete()
+        User.query.delete()
+        db.session.commit()
+
+        self.client = app.test_client()
+
+    def test_memory_bucket(self):
+        """Does a bucket allow a burst, then refill over time?"""
+        clock = FakeClock()
+        backend = MemoryBackend(clock=clock)
+        limit = Limit(burst=3, per_minute=6)
+
+        self.assertEqual([backend.take('key', limit) for _ in range(4)], [True, True, True, False])
+        # The rejected attempt left the bucket a token in debt.
+        clock.now += 10
+        self.assertFalse(backend.take('key', limit))
+        clock.now += 20
+        self.assertTrue(backend.take('key', limit))
+        self.assertTrue(backend.take('other', limit))
+
+    def test_memory_max_keys(self):
+        """Are the least recently used buckets dropped?"""
+        backend = MemoryBackend(max_keys=2)
+        limit = Limit(burst=1, per_minute=1)
+        for key in ('a', 'b', 'c'):
+            backend.take(key, limit)
+
+        self.assertTrue(backend.take('a', limit))
+        self.assertFalse(backend.take('c', limit))
+
+    def test_database_bucket(self):
+        """Does the shared bucket allow a burst and then reject?"""
+        backend = DatabaseBackend(db)
+        limit = Limit(burst=2, per_minute=1)
+
+        self.assertEqual([backend.take('key', limit) for _ in range(3)], [True, True, False])
+        self.assertLess(ThrottleBucket.query.get('key').tokens, 0)
+
+    def test_login_throttled(self):
+        """Are repeated bad logins rejected before the password is checked?"""
+        User.signup(username="throttled", email="throttled@test.com", password="password")
+        db.session.commit()
+        rejected = login_throttle.counts['rejected_user']
+
+        statuses = [self.client.post('/login', data={"username": "Throttled", "password": "wrongpassword"}).status_code
+                    for _ in range(6)]
+
+        self.assertEqual(statuses, [200] * 5 + [429])
+        self.assertEqual(login_throttle.counts['rejected_user'], rejected + 1)
+
+    def test_login_forwarded_ip(self):
+        """Behind a trusted proxy, does each client get its own IP bucket?"""
+        wsgi_app = app.wsgi_app
+        app.wsgi_app = ProxyFix(wsgi_app, x_for=1)
+        self.addCleanup(setattr, app, 'wsgi_app', wsgi_app)
+        burst = login_throttle.ip_limit.burst
+        rejected = login_throttle.counts['rejected_ip']
+        attempts = iter(range(1000))
+
+        def login(ip):
+            return self.client.post('/login', data={"username": f"user{next(attempts)}", "password": "wrongpassword"},
+                                    headers={'X-Forwarded-For': ip}).status_code
+
+        self.assertEqual([login('203.0.113.1') for _ in range(burst + 1)], [200] * burst + [429])
+        self.assertEqual(login('203.0.113.2'), 200)
+        self.assertEqual(login_throttle.counts['rejected_ip'], rejected + 1)
+
+    def test_ip_limit_off(self):
+        """Does a burst of 0 turn the per-IP limit off?"""
+        throttle = LoginThrottle(MemoryBackend(), user_limit=(5, 5), ip_limit=(0, 0))
+
+        self.assertTrue(all(throttle.allow(f"user{i}", '10.0.0.1') for i in range(50)))
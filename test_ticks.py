@@ -0,0 +1,89 @@
+import os
+from unittest import TestCase
+
+from models import db, User, Pet, Tick
+from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
+
+os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
+
+from app import app
+from ticks import apply_tick, id_ranges, partition
+
+db.drop_all()
+db.create_all()
+
+create_berry_db(db, berries)
+create_type_db(db, types)
+create_pokemon_db(15, db)
+
+
+class TickTestCase(TestCase):
+    """Test the batch tick engine"""
+    def setUp(self):
+        """Add a user with 25 pets"""
+        Tick.query.delete()
+        Pet.query.delete()
+        User.query.delete()
+
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+        db.session.add_all([
+            Pet(nickname=f"testpet{i}", user_id=1, poke_id=i % 15 + 1, hunger=4 * i)
+            for i in range(25)
+        ])
+        db.session.commit()
+
+    def test_partition(self):
+        """Do worker partitions cover the id range exactly once?"""
+        ranges = [partition(1, 100, 3, worker) for worker in range(3)]
+
+        self.assertEqual(ranges[0][0], 1)
+        self.assertEqual(ranges[-1][1], 101)
+        for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(stop, start)
+
+    def test_id_ranges(self):
+        """Are chunks keyset ranges of at most chunk_size pets?"""
+        ids = sorted(id for (id,) in db.session.query(Pet.id))
+        chunks = list(id_ranges(db.session, ids[0], ids[-1] + 1, chunk_size=10))
+
+        self.assertEqual([len([id for id in ids if lo <= id < hi]) for lo, hi in chunks], [10, 10, 5])
+
+    def test_apply_tick(self):
+        """Does a tick change every pet once, clamped like change_stats?"""
+        reports = [apply_tick(db, hunger=-20, happiness=10, chunk_size=4, workers=2, worker=worker, tick_id='t1')
+                   for worker in range(2)]
+
+        self.assertEqual(sum(report.rows for report in reports), 25)
+        stats = {pet.nickname: (pet.hunger, pet.happiness) for pet in Pet.query}
+        self.assertEqual(stats['testpet0'], (0, 60))
+        self.assertEqual(stats['testpet24'], (76, 60))
+
+    def test_tick_bounds_shared(self):
+        """Do workers split the range planned by the first one, even if
+        pets are adopted in between?"""
+        first = apply_tick(db, hunger=-1, chunk_size=4, workers=2, worker=0, tick_id='t2')
+        db.session.add_all([Pet(nickname=f"newpet{i}", user_id=1, poke_id=1) for i in range(10)])
+        db.session.commit()
+        second = apply_tick(db, hunger=-1, chunk_size=4, workers=2, worker=1, tick_id='t2')
+
+        self.assertEqual(first.rows + second.rows, 25)
+        self.assertEqual(Pet.query.filter_by(nickname="newpet0").one().hunger, 50)
+
+    def test_tick_resume(self):
+        """Does rerunning a finished tick leave the pets alone?"""
+        apply_tick(db, hunger=-20, chunk_size=4, tick_id='t3')
+        report = apply_tick(db, hunger=-20, chunk_size=4, tick_id='t3')
+
+        self.assertEqual((report.rows, report.chunks), (0, 0))
+        self.assertEqual(Pet.query.filter_by(nickname="testpet24").one().hunger, 76)
+
+        with self.assertRaises(ValueError):
+            apply_tick(db, hunger=-10, tick_id='t3')
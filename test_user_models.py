@@ -5,6 +5,7 @@ from models import db, User, Pokemon, Pet, Berry, Pokedex, Berrydex, UserBerry
 from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
 
 os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
 
 from app import app 
 
@@ -104,6 +105,28 @@ class UserModelTestCase(TestCase):
 
         self.assertIsNot(u_auth, User)
 
+    def test_user_auth_rehash(self):
+        """Is a password rehashed at login when the cost factor changes?"""
+        rounds = app.config['BCRYPT_LOG_ROUNDS']
+        app.config['BCRYPT_LOG_ROUNDS'] = 4
+        try:
+            u = User.signup(
+                email="test@test.com",
+                username="testuser",
+                password="HASHED_PASSWORD"
+            )
+            db.session.commit()
+            self.assertTrue(u.password.startswith('$2b$04$'))
+
+            app.config['BCRYPT_LOG_ROUNDS'] = 5
+            u_auth = User.authenticate(username="testuser", password="HASHED_PASSWORD")
+            db.session.commit()
+        finally:
+            app.config['BCRYPT_LOG_ROUNDS'] = rounds
+
+        self.assertTrue(u_auth.password.startswith('$2b$05$'))
+        self.assertIsInstance(User.authenticate(username="testuser", password="HASHED_PASSWORD"), User)
+
     def test_user_pet(self):
         """Does pets detect user pets?"""
         u = User(
@@ -141,6 +164,30 @@ class UserModelTestCase(TestCase):
         
         self.assertIn(berry, u.berries)
 
+    def test_user_berry_quantity(self):
+        """Do berries stack and get used up one at a time?"""
+        u = User(
+            id=1,
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD"
+        )
+        db.session.add(u)
+        db.session.commit()
+
+        UserBerry.add(1, 1)
+        UserBerry.add_many(1, {1: 2, 2: 1})
+        db.session.commit()
+        self.assertEqual(UserBerry.query.get((1, 1)).quantity, 3)
+        self.assertEqual(UserBerry.query.get((1, 2)).quantity, 1)
+
+        self.assertIsNone(UserBerry.take(1, 2, 2))
+        self.assertEqual(UserBerry.take(1, 2), 0)
+        db.session.commit()
+        db.session.expire_all()
+        self.assertIsNone(UserBerry.query.get((1, 2)))
+        self.assertIsNone(UserBerry.take(1, 2))
+
 
     def test_user_pokedex(self):
         """Does user.pokedex track user seen pokemon?"""
@@ -5,8 +5,12 @@ from models import db, User, Pokemon, Pet, Berry, Pokedex, Berrydex, UserBerry
 from functions import create_berry_db, create_pokemon_db, create_type_db, berries, types
 
 os.environ['DATABASE_URL'] = "postgresql:///poke-test"
+os.environ['POKEAPI_MODE'] = "replay"
 
-from app import app, CURR_USER_KEY
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import app, CURR_USER_KEY, CURR_USERNAME_KEY
 
 db.drop_all()
 db.create_all()
@@ -325,4 +329,65 @@ class UserViewTestCase(TestCase):
 
             self.assertEqual(resp.status_code, 200)
             self.assertIn("Access unauthorized", html)
-    
\ No newline at end of file
+
+    def test_lazy_current_user(self):
+        """Do pages that only need the user's id skip the users table?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+                session[CURR_USERNAME_KEY] = self.testuser.username
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            for path in ['/', '/pokedex', '/pets/adopt', '/does-not-exist']:
+                self.assertEqual(client.get(path).status_code, 200)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual([s for s in statements if 'FROM users' in s], [])
+
+    def test_lazy_current_user_deleted(self):
+        """Is a session for a deleted user logged out?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id + 1000
+
+            resp = client.get('/foraging')
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(resp.location, '/login')
+            with client.session_transaction() as session:
+                self.assertNotIn(CURR_USER_KEY, session)
+
+    def test_pages_no_lazy_loads(self):
+        """Do pages render without lazy-loading relationships?"""
+        with self.client as client:
+            with client.session_transaction() as session:
+                session[CURR_USER_KEY] = self.testuser.id
+        pets = [Pet(nickname=f"testpet{i}", user_id=self.testuser.id, poke_id=i) for i in range(1, 4)]
+        db.session.add_all(pets)
+        db.session.add_all([UserBerry(user_id=self.testuser.id, berry_id=i) for i in range(1, 4)])
+        db.session.commit()
+        db.session.add(Berrydex(pet_id=pets[0].id, berry_tried_id=1))
+        db.session.commit()
+        paths = [f'/users/{self.testuser.id}', '/foraging', f'/pets/{pets[0].id}', '/pets']
+        anon_paths = [f'/users/{self.testuser.id}', f'/pets/{pets[0].id}', '/pets']
+
+        lazy_loads = []
+        def record(orm_execute_state):
+            if orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+                lazy_loads.append(str(orm_execute_state.statement))
+        event.listen(Session, 'do_orm_execute', record)
+        try:
+            with app.test_client() as anon:
+                for page_client, path in [(client, path) for path in paths] + [(anon, path) for path in anon_paths]:
+                    # Empty the identity map so a lazy load can't be answered without a query.
+                    db.session.expunge_all()
+                    self.assertEqual(page_client.get(path).status_code, 200)
+        finally:
+            event.remove(Session, 'do_orm_execute', record)
+
+        self.assertEqual(lazy_loads, [])
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import Counter, namedtuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from models import ThrottleBucket
+
+# burst: attempts allowed at once; per_minute: how fast they come back.
+Limit = namedtuple('Limit', 'burst per_minute')
+
+
+class MemoryBackend:
+    """Token buckets in this process's memory.
+
+    Each worker process throttles on its own, so the effective limit is
+    multiplied by the number of workers. Least recently used buckets are
+    dropped past max_keys."""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, limit):
+        """Takes a token from key's bucket; returns whether there was one"""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.per_minute / 60)
+            allowed = tokens >= 1
+            # A rejected attempt leaves the bucket at most one token in debt,
+            # so an attacker who keeps trying stays throttled.
+            self._buckets[key] = (max(tokens - 1, -1), now)
+            while len(self._buckets) > self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+        return allowed
+
+
+class DatabaseBackend:
+    """Token buckets in the login_throttle table, shared by every process.
+
+    Each check is one upsert on its own connection, committed straight
+    away so it counts even if the request's transaction is rolled back."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def take(self, key, limit):
+        table = ThrottleBucket.__table__
+        now = func.clock_timestamp()
+        refilled = func.least(
+            limit.burst,
+            table.c.tokens + func.extract('epoch', now - table.c.updated) * limit.per_minute / 60)
+        stmt = insert(table).values(key=key, tokens=limit.burst - 1, updated=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={'tokens': func.greatest(refilled - 1, -1), 'updated': now}
+        ).returning(table.c.tokens)
+        with self.database.engine.begin() as conn:
+            return conn.execute(stmt).scalar() >= 0
+
+
+BACKENDS = {
+    'memory': lambda database: MemoryBackend(),
+    'database': DatabaseBackend,
+}
+
+
+class LoginThrottle:
+    """Limits login attempts per client IP and per username before any
+    password is checked. A limit with a burst of 0 isn't checked.
+
+    Counts allowed attempts and rejections by the limit that caused them;
+    the counters are per process."""
+
+    def __init__(self, backend, user_limit, ip_limit):
+        self.backend = backend
+        self.user_limit = Limit(*user_limit)
+        self.ip_limit = Limit(*ip_limit)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, database):
+        backend = BACKENDS[config['LOGIN_THROTTLE_BACKEND']](database)
+        return cls(backend, config['LOGIN_USER_LIMIT'], config['LOGIN_IP_LIMIT'])
+
+    def allow(self, username, ip):
+        """Returns whether this login attempt may go ahead"""
+        if self.ip_limit.burst and not self.backend.take(f"ip:{ip}", self.ip_limit):
+            result = 'rejected_ip'
+        elif self.user_limit.burst and not self.backend.take(f"user:{username.lower()}", self.user_limit):
+            result = 'rejected_user'
+        else:
+            result = 'allowed'
+        with self._lock:
+            self.counts[result] += 1
+        return result == 'allowed'
@@ -0,0 +1,149 @@
+"""Applies stat changes to every pet, e.g. "all pets get hungrier overnight".
+
+Pets are updated in chunks of consecutive ids. Each chunk is one set-based
+UPDATE committed on its own, so row locks are held only briefly. Chunk
+boundaries are found by keyset over the primary key, never with OFFSET on
+the whole table.
+
+A tick has an id. The first process to start it records the deltas and the
+pet id range, and every worker splits that same range, so pets adopted or
+released meanwhile can't make partitions overlap or leave gaps. Each
+worker's progress is committed with every chunk, so running a tick again
+after a crash only does the chunks that weren't finished. Several
+processes share a tick by giving the same id:
+
+    flask --app app tick --hunger -10 --tick-id nightly-1018 --workers 4 --worker 0
+    flask --app app tick --hunger -10 --tick-id nightly-1018 --workers 4 --worker 1
+    ...
+"""
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from models import Pet, Pokemon, Tick, TickProgress
+
+DEFAULT_CHUNK_SIZE = 5000
+
+TickReport = namedtuple('TickReport', 'tick_id rows chunks seconds')
+
+
+def new_tick_id():
+    """Unique id for a tick started without one"""
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{secrets.token_hex(3)}"
+
+
+def partition(lo, hi, workers, worker):
+    """Splits ids lo..hi into workers contiguous ranges and returns the
+    worker-th as a half-open (start, stop) pair"""
+    if not 0 <= worker < workers:
+        raise ValueError(f"worker must be between 0 and {workers - 1}, not {worker}")
+    span = hi - lo + 1
+    start = lo + span * worker // workers
+    stop = lo + span * (worker + 1) // workers
+    return start, stop
+
+
+def _next_boundary(session, lo, stop, chunk_size):
+    """The id chunk_size pets past lo, or stop if there aren't that many,
+    found with an index-only scan of the primary key"""
+    hi = session.execute(
+        select(Pet.id)
+        .where(Pet.id >= lo, Pet.id < stop)
+        .order_by(Pet.id)
+        .offset(chunk_size)
+        .limit(1)
+    ).scalar()
+    return stop if hi is None else hi
+
+
+def id_ranges(session, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields half-open (lo, hi) id ranges covering start..stop, each
+    holding at most chunk_size pets"""
+    lo = start
+    while lo < stop:
+        hi = _next_boundary(session, lo, stop, chunk_size)
+        yield lo, hi
+        lo = hi
+
+
+def plan_tick(session, tick_id, hunger=0, happiness=0, workers=1):
+    """Records the tick if it's new, fixing the pet id range its workers
+    split, and returns it. Raises ValueError if the tick was started with
+    other deltas or another worker count."""
+    session.execute(
+        insert(Tick)
+        .from_select(
+            ['id', 'hunger', 'happiness', 'workers', 'first_pet_id', 'last_pet_id'],
+            select(literal(tick_id), literal(hunger), literal(happiness), literal(workers),
+                   func.min(Pet.id), func.max(Pet.id)))
+        .on_conflict_do_nothing(index_elements=['id'])
+    )
+    session.commit()
+    tick = session.get(Tick, tick_id)
+    if (tick.hunger, tick.happiness, tick.workers) != (hunger, happiness, workers):
+        raise ValueError(
+            f"Tick {tick_id} was started with hunger {tick.hunger:+d}, happiness {tick.happiness:+d} "
+            f"and {tick.workers} workers")
+    return tick
+
+
+def apply_tick(database, hunger=0, happiness=0, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, worker=0, tick_id=None):
+    """Adds the deltas to every pet in this worker's partition of the tick.
+
+    Uses the same decay and clamping as Pet.change_stats. Each chunk is
+    committed together with the worker's progress, under a lock on it, so
+    a chunk is applied once even if the tick is rerun or a worker is
+    started twice. Every worker of a tick must be given the same tick_id;
+    a single worker gets a new one if none is given. Returns a
+    TickReport."""
+    if tick_id is None:
+        if workers > 1:
+            raise ValueError("Every worker of a tick needs the same tick_id")
+        tick_id = new_tick_id()
+    session = database.session
+    started = time.perf_counter()
+
+    tick = plan_tick(session, tick_id, hunger, happiness, workers)
+    if tick.first_pet_id is None:
+        return TickReport(tick_id, 0, 0, time.perf_counter() - started)
+
+    start, stop = partition(tick.first_pet_id, tick.last_pet_id, workers, worker)
+    session.execute(
+        insert(TickProgress)
+        .values(tick_id=tick_id, worker=worker, next_pet_id=start)
+        .on_conflict_do_nothing(index_elements=['tick_id', 'worker'])
+    )
+    session.commit()
+
+    progress = (TickProgress.tick_id == tick_id) & (TickProgress.worker == worker)
+    values = Pet.stat_update_values(hunger, happiness)
+    rows = chunks = 0
+    while True:
+        lo = session.execute(select(TickProgress.next_pet_id).where(progress).with_for_update()).scalar()
+        if lo >= stop:
+            session.commit()
+            break
+        hi = _next_boundary(session, lo, stop, chunk_size)
+        result = session.execute(
+            update(Pet)
+            .where(Pet.id >= lo, Pet.id < hi, Pokemon.id == Pet.poke_id)
+            .values(values),
+            execution_options={'synchronize_session': False}
+        )
+        session.execute(update(TickProgress).where(progress).values(next_pet_id=hi))
+        session.commit()
+        rows += result.rowcount
+        chunks += 1
+
+    return TickReport(tick_id, rows, chunks, time.perf_counter() - started)
+
+
+def format_tick_report(report):
+    """Formats apply_tick's report as one line"""
+    rate = report.rows / report.seconds if report.seconds else float('inf')
+    return (f"Tick {report.tick_id}: updated {report.rows} pets in {report.chunks} chunks, "
+            f"{report.seconds:.2f}s ({rate:,.0f} rows/s)")